@@ -0,0 +1,185 @@
+"""Drive the src/app.py routes at fixed concurrency levels and report latency.
+
+For each route and concurrency level, ``--requests`` requests are sent by
+``concurrency`` workers. The report gives p50/p95/p99 latency, throughput and
+error counts. With ``--spawn`` the stub upstreams and the app are started
+first, so the whole benchmark runs offline.
+
+Every request carries a unique tag in its post, prompt or topics so it misses
+the app's caches and single-flight coalescing and exercises the upstream
+path; ``--repeat-inputs`` draws from a small fixed set instead, to measure
+the cached path.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+
+import httpx
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+USER_POSTS = [
+    "Just saw an amazing demo of Mosaic AI agents!",
+    "Learning so much about Unity Catalog governance today",
+    "The keynote on the Data Intelligence Platform was inspiring",
+    "Great hallway chats about LLMOps and RAG",
+]
+TOPICS = [
+    "Mosaic AI, Data Intelligence Platform",
+    "Unity Catalog, Data Governance",
+    "LLMOps, RAG, Mosaic AI",
+    "Databricks SQL, AI/BI Genie",
+]
+
+REPEAT_INPUTS = False
+
+
+def tag(separator=" #"):
+    """A unique marker per request, unless inputs are meant to repeat."""
+    return "" if REPEAT_INPUTS else f"{separator}{uuid.uuid4().hex[:12]}"
+
+
+ROUTES = {
+    "/generate-social-media-post": lambda: {
+        "user_post": random.choice(USER_POSTS) + tag(),
+        "user_role": "attendee",
+        "social_media_site": random.choice(["LinkedIn", "Facebook", "Instagram"]),
+    },
+    "/generate-social-media-posts": lambda: {
+        "user_post": random.choice(USER_POSTS) + tag(),
+        "user_role": "attendee",
+        "social_media_sites": ["LinkedIn", "Facebook", "Instagram"],
+    },
+    "/generate-image-prompt-n-get-topics": lambda: {
+        "user_post": random.choice(USER_POSTS) + tag()
+    },
+    "/generate-image": lambda: {
+        "img_prompt": "A vibrant conference hall in Atlanta, warm stage lights" + tag()
+    },
+    "/get-links-from-topics": lambda: {"topics": random.choice(TOPICS) + tag(", ")},
+}
+
+
+def percentile(values, pct):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[idx]
+
+
+async def run_level(client, route, concurrency, total):
+    latencies = []
+    errors = 0
+    remaining = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            start = time.perf_counter()
+            try:
+                response = await client.post(route, json=ROUTES[route]())
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+            except httpx.HTTPError:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        "route": route,
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": errors,
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "mean": statistics.fmean(latencies) if latencies else float("nan"),
+    }
+
+
+async def wait_ready(url, timeout=60):
+    # /ready answers 503 until startup and warm-up are done.
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(url)).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.25)
+    raise RuntimeError(f"{url} did not become ready within {timeout}s")
+
+
+def spawn(args):
+    stubs = subprocess.Popen(
+        [sys.executable, os.path.join(HERE, "stubs.py")] + args.stub_args.split()
+    )
+    app = subprocess.Popen(
+        [sys.executable, os.path.join(HERE, "serve_app.py"), "--port", str(args.port)]
+    )
+    return [stubs, app]
+
+
+async def main(args):
+    processes = spawn(args) if args.spawn else []
+    base_url = args.base_url or f"http://127.0.0.1:{args.port}"
+    try:
+        await wait_ready(f"{base_url}/ready")
+        results = []
+        limits = httpx.Limits(max_connections=max(args.concurrency))
+        async with httpx.AsyncClient(
+            base_url=base_url, timeout=args.timeout, limits=limits
+        ) as client:
+            for route in args.routes:
+                for concurrency in args.concurrency:
+                    result = await run_level(client, route, concurrency, args.requests)
+                    results.append(result)
+                    print(
+                        f"{route:40} c={concurrency:<4} rps={result['rps']:8.2f} "
+                        f"p50={result['p50']:.3f}s p95={result['p95']:.3f}s "
+                        f"p99={result['p99']:.3f}s errors={result['errors']}"
+                    )
+        if args.json:
+            with open(args.json, "w") as file:
+                json.dump(results, file, indent=2)
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", help="Benchmark an already running app")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--spawn", action="store_true")
+    parser.add_argument(
+        "--stub-args", default="", help="Extra arguments for stubs.py when spawning"
+    )
+    parser.add_argument(
+        "--routes", nargs="+", default=list(ROUTES), choices=list(ROUTES)
+    )
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument(
+        "--repeat-inputs",
+        action="store_true",
+        help="Reuse a few fixed inputs, so most requests hit the app's caches",
+    )
+    args = parser.parse_args()
+    REPEAT_INPUTS = args.repeat_inputs
+    asyncio.run(main(args))
@@ -0,0 +1,55 @@
+"""Run src/app.py against the stub upstreams from bench/stubs.py.
+
+The chat and replicate clients are pointed at the stubs through their
+normal base URL settings. DuckDuckGo has no such setting, so the app is
+given a search tool that queries the stub search server instead.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+
+import httpx
+import uvicorn
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--stub-host", default="127.0.0.1")
+    parser.add_argument("--chat-port", type=int, default=9101)
+    parser.add_argument("--image-port", type=int, default=9102)
+    parser.add_argument("--search-port", type=int, default=9103)
+    args = parser.parse_args()
+
+    os.environ.update(
+        {
+            "API_BASE": f"http://{args.stub_host}:{args.chat_port}/",
+            "API_KEY": "stub",
+            "ENDPOINT_NAME": "stub-links",
+            "IMAGE_MODEL_NAME": "stub/flux",
+            "REPLICATE_BASE_URL": f"http://{args.stub_host}:{args.image_port}",
+            "REPLICATE_API_TOKEN": "stub",
+        }
+    )
+    # Start every run with an empty image cache.
+    os.environ.setdefault("IMAGE_CACHE_DIR", tempfile.mkdtemp(prefix="splash-bench-"))
+    search_url = f"http://{args.stub_host}:{args.search_port}/search"
+
+    class StubSearchResults:
+        def invoke(self, query):
+            return httpx.get(search_url, params={"q": query}, timeout=30).text
+
+    sys.path.insert(0, SRC)
+    import app
+
+    app.app.state.search_tool = StubSearchResults()
+    uvicorn.run(app.app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+"""Local stand-ins for the upstreams src/app.py calls, for load testing.
+
+Runs three servers with configurable latency distributions:
+
+- an OpenAI/Databricks-compatible chat endpoint (``POST /chat/completions``,
+  streaming and non-streaming), answering in the dspy template format
+- a replicate-like image endpoint (``POST /v1/models/{owner}/{name}/predictions``)
+- a search endpoint (``GET /search?q=...``) returning DuckDuckGoSearchResults text
+
+Latencies are given as ``fixed:S``, ``uniform:LO,HI`` or ``lognormal:MEDIAN,SIGMA``
+in seconds.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+import uuid
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+
+
+def parse_latency(spec):
+    kind, _, params = spec.partition(":")
+    values = [float(v) for v in params.split(",") if v]
+    if kind == "fixed":
+        return lambda: values[0]
+    if kind == "uniform":
+        return lambda: random.uniform(values[0], values[1])
+    if kind == "lognormal":
+        return lambda: random.lognormvariate(math.log(values[0]), values[1])
+    raise ValueError(f"Unknown latency distribution: {spec!r}")
+
+
+POST_COMPLETION = (
+    "produce the post. We look at the local time and the agenda.\n\n"
+    "Rationale: The user is in an AI session, so the post highlights it.\n\n"
+    "Current Session: Comprehensive Guide to Mosaic AI\n\n"
+    "Post: Loving the Mosaic AI session at #DAIWT Atlanta! Production GenAI "
+    "is here 🚀 #Databricks #MosaicAI #GenAI"
+)
+IMAGE_PROMPT_COMPLETION = (
+    "produce the flux_prompt. We pick out the Databricks topics.\n\n"
+    "Extracted Topics: Mosaic AI, Data Intelligence Platform\n\n"
+    "Flux Prompt: A vibrant conference hall in Atlanta, warm stage lights, "
+    "attendees collaborating around glowing screens"
+)
+LINKS_COMPLETION = '["https://www.databricks.com/product/machine-learning"]'
+# Smallest valid lossless WebP (1x1), served as every generated image.
+STUB_IMAGE = bytes.fromhex(
+    "524946461a000000574542505650384c0d0000002f0000001007101111888808"
+)
+
+
+def variants_completion(prompt):
+    # The last "Social Media Sites:" line is the live request, not a demo.
+    sites = prompt.rsplit("Social Media Sites:", 1)[1].split("\n")[0].split(",")
+    posts = [
+        {"social_media_site": site.strip(), "post": POST_COMPLETION.rsplit("Post: ")[1]}
+        for site in sites
+    ]
+    return (
+        "produce the posts. We look at the local time and the agenda.\n\n"
+        "Rationale: The user is in an AI session, so the posts highlight it.\n\n"
+        "Current Session: Comprehensive Guide to Mosaic AI\n\n"
+        f"Posts: {json.dumps(posts)}"
+    )
+
+
+def completion_for(prompt):
+    if "Flux Prompt:" in prompt and "Post:" in prompt.replace("User Post:", ""):
+        # The fused signature: post fields, then image prompt fields
+        return POST_COMPLETION + "\n\n" + IMAGE_PROMPT_COMPLETION.split("\n\n", 1)[1]
+    if "Flux Prompt:" in prompt:
+        return IMAGE_PROMPT_COMPLETION
+    if "Posts:" in prompt:
+        return variants_completion(prompt)
+    if "Post:" in prompt:
+        return POST_COMPLETION
+    return LINKS_COMPLETION
+
+
+def chat_app(latency):
+    app = FastAPI()
+
+    @app.post("/chat/completions")
+    @app.post("/v1/chat/completions")
+    @app.post("/serving-endpoints/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        prompt = body["messages"][-1]["content"]
+        content = completion_for(prompt)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        usage = {
+            "prompt_tokens": len(prompt) // 4,
+            "completion_tokens": len(content) // 4,
+            "total_tokens": (len(prompt) + len(content)) // 4,
+        }
+        delay = latency()
+
+        if body.get("stream"):
+            words = content.split(" ")
+
+            async def chunks():
+                for i, word in enumerate(words):
+                    await asyncio.sleep(delay / len(words))
+                    text = word if i == 0 else " " + word
+                    chunk = {
+                        "id": completion_id,
+                        "object": "chat.completion.chunk",
+                        "created": int(time.time()),
+                        "model": body["model"],
+                        "choices": [
+                            {
+                                "index": 0,
+                                "delta": {"content": text},
+                                "finish_reason": None,
+                            }
+                        ],
+                    }
+                    yield f"data: {json.dumps(chunk)}\n\n"
+                if (body.get("stream_options") or {}).get("include_usage"):
+                    chunk = {
+                        "id": completion_id,
+                        "object": "chat.completion.chunk",
+                        "created": int(time.time()),
+                        "model": body["model"],
+                        "choices": [],
+                        "usage": usage,
+                    }
+                    yield f"data: {json.dumps(chunk)}\n\n"
+                yield "data: [DONE]\n\n"
+
+            return StreamingResponse(chunks(), media_type="text/event-stream")
+
+        await asyncio.sleep(delay)
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body["model"],
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": usage,
+        }
+
+    return app
+
+
+def image_app(latency):
+    app = FastAPI()
+
+    @app.post("/v1/models/{owner}/{name}/predictions")
+    async def create_prediction(owner: str, name: str, request: Request):
+        body = await request.json()
+        await asyncio.sleep(latency())
+        prediction_id = uuid.uuid4().hex
+        return {
+            "id": prediction_id,
+            "model": f"{owner}/{name}",
+            "version": "stub",
+            "status": "succeeded",
+            "input": body.get("input", {}),
+            "output": [f"{request.base_url}files/{prediction_id}.webp"],
+            "logs": "",
+            "error": None,
+            "metrics": {"predict_time": 0},
+            "urls": {},
+        }
+
+    @app.get("/files/{name}")
+    async def get_file(name: str):
+        return Response(content=STUB_IMAGE, media_type="image/webp")
+
+    return app
+
+
+def search_app(latency):
+    app = FastAPI()
+
+    @app.get("/search")
+    async def search(q: str):
+        await asyncio.sleep(latency())
+        slug = uuid.uuid5(uuid.NAMESPACE_URL, q).hex[:8]
+        results = [
+            f"[snippet: Databricks blog post about {q[:40]}, title: Blog {slug}, "
+            f"link: https://www.databricks.com/blog/{slug}]",
+            f"[snippet: Video walkthrough, title: Video {slug}, "
+            f"link: https://www.youtube.com/watch?v={slug}]",
+            f"[snippet: Docs, title: Docs {slug}, "
+            f"link: https://docs.databricks.com/en/{slug}.html]",
+        ]
+        return PlainTextResponse(", ".join(results))
+
+    return app
+
+
+async def serve(args):
+    servers = [
+        uvicorn.Server(
+            uvicorn.Config(app, host=args.host, port=port, log_level="warning")
+        )
+        for app, port in [
+            (chat_app(parse_latency(args.lm_latency)), args.chat_port),
+            (image_app(parse_latency(args.image_latency)), args.image_port),
+            (search_app(parse_latency(args.search_latency)), args.search_port),
+        ]
+    ]
+    await asyncio.gather(*(server.serve() for server in servers))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--chat-port", type=int, default=9101)
+    parser.add_argument("--image-port", type=int, default=9102)
+    parser.add_argument("--search-port", type=int, default=9103)
+    parser.add_argument("--lm-latency", default="lognormal:1.5,0.4")
+    parser.add_argument("--image-latency", default="lognormal:4,0.3")
+    parser.add_argument("--search-latency", default="lognormal:0.8,0.5")
+    asyncio.run(serve(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+import asyncio
+import json
+import math
+import os
+from contextlib import asynccontextmanager
+
+from metrics import Counter, Gauge, current_route, registry
+
+# Per-upstream concurrency limit, queue depth and longest queue wait (seconds).
+# Any of them can be overridden for a single route through ROUTE_ADMISSION, e.g.
+# {"/generate-image": {"replicate": {"limit": 2, "max_queue": 4, "max_wait": 1}}}
+# A route's limit caps its share of the upstream's slots; it cannot raise it.
+DEFAULTS = {
+    "lm": {"limit": 32, "max_queue": 64, "max_wait": 5.0},
+    "link_llm": {"limit": 16, "max_queue": 32, "max_wait": 5.0},
+    "replicate": {"limit": 8, "max_queue": 16, "max_wait": 10.0},
+    "search": {"limit": 8, "max_queue": 32, "max_wait": 5.0},
+}
+ROUTE_ADMISSION = json.loads(os.getenv("ROUTE_ADMISSION", "{}"))
+
+shed = Counter("splash_shed_total", "Requests rejected by admission control.")
+queued = Gauge("splash_upstream_queued", "Calls waiting for an upstream slot.")
+registry.extend([shed, queued])
+
+
+def setting(upstream, name):
+    env = os.getenv(f"ADMISSION_{upstream.upper()}_{name.upper()}")
+    default = DEFAULTS[upstream][name]
+    return type(default)(env) if env is not None else default
+
+
+class Overloaded(Exception):
+    def __init__(self, upstream, retry_after):
+        super().__init__(f"{upstream} is overloaded, retry in {retry_after}s")
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+
+async def acquire_all(semaphores):
+    """Acquire ``semaphores`` in order, or none of them if interrupted."""
+    acquired = []
+    try:
+        for semaphore in semaphores:
+            await semaphore.acquire()
+            acquired.append(semaphore)
+    except BaseException:
+        for semaphore in acquired:
+            semaphore.release()
+        raise
+
+
+class UpstreamLimiter:
+    """Bounds concurrent calls to one upstream and sheds load past its queue.
+
+    A caller that finds every slot busy waits in the queue for at most
+    ``max_wait`` seconds; when ``max_queue`` callers are already waiting it is
+    rejected straight away. Both raise Overloaded.
+
+    Routes with their own ``limit`` in ROUTE_ADMISSION also take a slot from
+    a semaphore of that size first. ``release()`` finds it through the
+    current route, so it has to run in the caller's context.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.limit = setting(name, "limit")
+        self.max_queue = setting(name, "max_queue")
+        self.max_wait = setting(name, "max_wait")
+        self.waiting = 0
+        self._slots = asyncio.Semaphore(self.limit)
+        self._route_slots = {
+            route: asyncio.Semaphore(overrides[name]["limit"])
+            for route, overrides in ROUTE_ADMISSION.items()
+            if "limit" in overrides.get(name, {})
+        }
+
+    @property
+    def busy(self):
+        """Every slot is taken or someone is already queueing."""
+        return self._slots.locked() or self.waiting > 0
+
+    def route_settings(self):
+        overrides = ROUTE_ADMISSION.get(current_route.get(), {}).get(self.name, {})
+        return (
+            overrides.get("max_queue", self.max_queue),
+            overrides.get("max_wait", self.max_wait),
+        )
+
+    def reject(self, max_wait):
+        shed.inc(upstream=self.name, route=current_route.get())
+        raise Overloaded(self.name, max(1, math.ceil(max_wait)))
+
+    async def acquire(self):
+        max_queue, max_wait = self.route_settings()
+        semaphores = [self._slots]
+        route_slots = self._route_slots.get(current_route.get())
+        if route_slots is not None:
+            semaphores.insert(0, route_slots)
+        if not any(semaphore.locked() for semaphore in semaphores):
+            await acquire_all(semaphores)
+            return
+        if self.waiting >= max_queue:
+            self.reject(max_wait)
+        self.waiting += 1
+        queued.inc(upstream=self.name)
+        try:
+            await asyncio.wait_for(acquire_all(semaphores), max_wait)
+        except asyncio.TimeoutError:
+            self.reject(max_wait)
+        finally:
+            self.waiting -= 1
+            queued.dec(upstream=self.name)
+
+    def release(self):
+        self._slots.release()
+        route_slots = self._route_slots.get(current_route.get())
+        if route_slots is not None:
+            route_slots.release()
+
+    @asynccontextmanager
+    async def slot(self):
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+
+limiters = {name: UpstreamLimiter(name) for name in DEFAULTS}
@@ -0,0 +1,185 @@
+import bisect
+import json
+import os
+import re
+import threading
+
+# Sessions only carry a start time in agenda.json. The post generator prompt
+# assumes each session runs for at least 40 minutes, so a session ends at the
+# later of start + 40 minutes and the next distinct start time on the agenda.
+MIN_SESSION_MINUTES = 40
+LOOKAHEAD_MINUTES = int(os.getenv("AGENDA_LOOKAHEAD_MINUTES", "15"))
+AGENDA_PATH = os.getenv(
+    "AGENDA_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "agenda.json"),
+)
+AGENDA_POLL_SECONDS = float(os.getenv("AGENDA_POLL_SECONDS", "5"))
+
+AI_PATTERN = re.compile(
+    r"\b(AI|GenAI|Generative|LLM\w*|Mosaic\s?AI|MLflow|RAG|agents?)\b",
+    re.IGNORECASE,
+)
+TIME_PATTERN = re.compile(r"(\d{1,2}):(\d{2})\s*([AP]M)", re.IGNORECASE)
+
+
+def parse_clock(value):
+    """Minutes since midnight for strings like "9:00 AM EDT" or "01:45 PM EDT"."""
+    match = TIME_PATTERN.search(value)
+    if match is None:
+        raise ValueError(f"Unrecognised agenda time: {value!r}")
+    hour, minute, meridiem = int(match.group(1)), int(match.group(2)), match.group(3)
+    hour = hour % 12 + (12 if meridiem.upper() == "PM" else 0)
+    return hour * 60 + minute
+
+
+def is_ai_session(session):
+    return bool(
+        AI_PATTERN.search(session.get("title", ""))
+        or AI_PATTERN.search(session.get("description", ""))
+    )
+
+
+class AgendaIndex:
+    """Interval index over agenda sessions, sorted by start time."""
+
+    def __init__(self, agenda, lookahead_minutes=LOOKAHEAD_MINUTES):
+        self.lookahead_minutes = lookahead_minutes
+        sessions = sorted(
+            agenda.get("sessions", []), key=lambda s: parse_clock(s["time"])
+        )
+        starts = [parse_clock(s["time"]) for s in sessions]
+        distinct_starts = sorted(set(starts))
+
+        self.sessions = sessions
+        self.starts = starts
+        self.ends = []
+        self.tracks = []
+        self.ai = []
+        for session, start in zip(sessions, starts):
+            next_idx = bisect.bisect_right(distinct_starts, start)
+            next_start = (
+                distinct_starts[next_idx] if next_idx < len(distinct_starts) else start
+            )
+            self.ends.append(max(start + MIN_SESSION_MINUTES, next_start))
+            self.tracks.append(session.get("sessionType", ""))
+            self.ai.append(is_ai_session(session))
+        self.max_duration = max(
+            (end - start for start, end in zip(self.starts, self.ends)), default=0
+        )
+
+        # The overlapping set only changes when a session enters the lookahead
+        # window, starts or ends, so serialize each segment between those
+        # boundaries once instead of on every request.
+        self.boundaries = sorted(
+            {start - self.lookahead_minutes for start in self.starts}
+            | set(self.starts)
+            | set(self.ends)
+        )
+        self.fragments = [
+            json.dumps({"sessions": self._overlapping(minute)})
+            for minute in self.boundaries
+        ]
+        self.empty_fragment = json.dumps({"sessions": []})
+
+    def sessions_at(self, local_time):
+        """Sessions in progress at ``local_time`` or starting within the lookahead.
+
+        Ranked AI sessions first, then in-progress before upcoming, then by start.
+        """
+        return self._overlapping(parse_clock(local_time))
+
+    def _overlapping(self, now):
+        lo = bisect.bisect_left(self.starts, now - self.max_duration)
+        hi = bisect.bisect_right(self.starts, now + self.lookahead_minutes)
+        matches = []
+        for i in range(lo, hi):
+            if self.ends[i] <= now:
+                continue
+            in_progress = self.starts[i] <= now
+            matches.append((not self.ai[i], not in_progress, self.starts[i], i))
+        matches.sort()
+        return [
+            {
+                **self.sessions[i],
+                "status": "in progress" if not upcoming else "starting soon",
+            }
+            for _, upcoming, _, i in matches
+        ]
+
+    def prompt_fragment(self, local_time):
+        segment = bisect.bisect_right(self.boundaries, parse_clock(local_time)) - 1
+        if segment < 0:
+            return self.empty_fragment
+        return self.fragments[segment]
+
+
+class AgendaSnapshot:
+    """Everything derived from one version of agenda.json. Never mutated."""
+
+    def __init__(self, agenda, mtime, build_demos=None):
+        self.agenda = agenda
+        self.mtime = mtime
+        self.index = AgendaIndex(agenda)
+        self.demos = build_demos(self.index) if build_demos else []
+
+    def prompt_fragment(self, local_time):
+        return self.index.prompt_fragment(local_time)
+
+
+class AgendaStore:
+    """Holds the current AgendaSnapshot and reloads it when the file changes.
+
+    A background thread polls the file's mtime and builds a complete new
+    snapshot before swapping the reference, so readers take ``snapshot`` once
+    per request and never block or observe a partially loaded agenda.
+    """
+
+    def __init__(
+        self, path=AGENDA_PATH, build_demos=None, poll_seconds=AGENDA_POLL_SECONDS
+    ):
+        self.path = path
+        self.build_demos = build_demos
+        self.poll_seconds = poll_seconds
+        self.snapshot = self._load()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _load(self):
+        mtime = os.stat(self.path).st_mtime
+        with open(self.path, "r") as file:
+            agenda = json.load(file)
+        return AgendaSnapshot(agenda, mtime, self.build_demos)
+
+    def reload_if_changed(self):
+        try:
+            if os.stat(self.path).st_mtime == self.snapshot.mtime:
+                return False
+            self.snapshot = self._load()
+        except Exception as e:
+            # Keep serving the last good agenda while the file is mid-edit or
+            # malformed (e.g. {"time": null} or a top-level list).
+            print(f"Agenda reload from {self.path} failed: {e}")
+            return False
+        return True
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._watch, name="agenda-watcher", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_seconds):
+            try:
+                self.reload_if_changed()
+            except Exception as e:
+                # Never let the watcher die; the next change gets another try.
+                print(f"Agenda watcher error: {e}")
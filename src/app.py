@@ -1,108 +1,91 @@
+import time
+
+IMPORT_STARTED = time.perf_counter()
+
 from dotenv import load_dotenv
 import os
-import dspy
 import json
+import asyncio
+import functools
+import hashlib
+import importlib
+from typing import Any, List, Optional
 from datetime import datetime
-import pytz
-import replicate
-from pydantic import BaseModel
-from fastapi import FastAPI
-import random
+from pydantic import BaseModel, Field
+from fastapi import FastAPI, HTTPException, Request
+from contextlib import asynccontextmanager
 import uvicorn
-from fastapi.responses import JSONResponse
-from openai import OpenAI
+from fastapi.responses import (
+    FileResponse,
+    JSONResponse,
+    PlainTextResponse,
+    Response,
+    StreamingResponse,
+)
+
 # from databricks.sdk import WorkspaceClient
 # import time
-from langchain_community.tools import DuckDuckGoSearchResults
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.routing import Match
+from agenda_index import AgendaStore
+from upstream import UPSTREAM_POOL_SIZE, run_upstream, shutdown_upstream_executor
+from search_cache import normalize_topics
+from shared_cache import CACHE_BACKEND, WORKERS, make_cache
+from links import extract_links
+from image_cache import IMAGE_CACHE, IMAGE_FILES_PATH, ImageCache, image_key
+from image_jobs import IMAGE_JOB_RETENTION, ImageJobStore
+from batching import LM_BATCHING, MicroBatcher, dispatch_burst
+import metrics
+from metrics import current_route, record_usage, track
+from admission import Overloaded, limiters
+from resilience import DeadlineExceeded, FailoverRouter
+from singleflight import SingleFlight
+from prefetch import PREFETCH, Prefetcher
+import tracing
+from tracing import annotate
+from streaming import chat_deltas, sse_event, stream_field_line
+
+# dspy, openai, replicate, langchain_community and pytz are imported lazily:
+# in the lifespan startup phase or at first use, never at module import.
 
 load_dotenv()
 API_BASE = os.getenv("API_BASE")
 API_KEY = os.getenv("API_KEY")
 ENDPOINT_NAME = os.getenv("ENDPOINT_NAME")
 IMAGE_MODEL_NAME = os.getenv("IMAGE_MODEL_NAME")
+LINKS_TIMEOUT = float(os.getenv("LINKS_TIMEOUT", "30"))
+LINKS_MAX_RETRIES = int(os.getenv("LINKS_MAX_RETRIES", "2"))
+LM_POOL_SIZE = int(os.getenv("LM_POOL_SIZE", str(UPSTREAM_POOL_SIZE)))
+WARMUP = os.getenv("WARMUP", "true").lower() in ("1", "true", "yes")
+# API-only workers can set SERVE_UI=false to skip importing gradio; when on,
+# gradio is imported and mounted in the lifespan startup phase. Gradio keeps
+# its queue and sessions in process, so the UI needs a single worker.
+SERVE_UI = os.getenv("SERVE_UI", "true").lower() in ("1", "true", "yes")
+if SERVE_UI and WORKERS > 1:
+    print(f"Not mounting the UI: it needs WORKERS=1, got {WORKERS}")
+    SERVE_UI = False
+UI_PATH = os.getenv("UI_PATH", "/ui")
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", "86400"))
+
+LM_MODEL = "sg-external"
 
 
-def get_model():
-    return dspy.Databricks(
-        model="sg-external",
+def get_model(model=LM_MODEL):
+    from lm_pool import PooledDatabricks
+
+    return PooledDatabricks(
+        model=model,
         model_type="chat",
         api_key=API_KEY,
         api_base=API_BASE,
         max_tokens=2000,
-        temperature=round(0.7 + (random.randint(1, 100) / 10000), 4),
-    )
-
-
-dspy.configure(lm=get_model())
-
-with open("agenda.json", "r") as file:
-    agenda = json.load(file)
-
-agenda = json.dumps(agenda)
-
-
-class SocialMediaPostGenerator(dspy.Signature):
-    """You are a social media assistant who generates an engaging social media post with hashtags about the user's experience at the Databricks Data & AI World Tour 2024 (DAIWT) in Atlanta. This is a tech conference about Data and AI. Call out sessions where the local time overlaps with the user's post and assume that the user is one of the sessions if overlap happens between local time and session time. Each session is atleast 40 minutes. If there are multiple sessions that overlap, always choose AI sessions. If there are no AI sessions, choose based on current session.Give all posts a very positive spin to help it go viral. Ongoing sessions take priority, unless the user specifically calls out other sessions or topics"""
-
-    local_time = dspy.InputField()
-    user_post = dspy.InputField()
-    user_role = dspy.InputField(
-        desc="User's role in the conference. Either attendee or organizer or presenter"
+        temperature=0.7,
     )
-    agenda = dspy.InputField()
-    social_media_site = dspy.InputField()
-    rationale = dspy.OutputField(desc="Reasoning behind the post content and hashtags")
-    current_session = dspy.OutputField(
-        desc="Current session that the user could be in. If there isn't a match, return None"
-    )
-    post = dspy.OutputField(
-        desc="Engaging social media post with hashtags. Pay specific attention to any current session the user is in.This is the ongoing session."
-    )
-
-
-class EngagingSocialMediaPost(dspy.Module):
-    def __init__(self):
-        super().__init__()
-        self.generator = dspy.ChainOfThought(SocialMediaPostGenerator)
-
-    def forward(self, local_time, user_post, user_role, agenda, social_media_site):
-        return self.generator(
-            local_time=local_time,
-            user_post=user_post,
-            user_role=user_role,
-            agenda=agenda,
-            social_media_site=social_media_site,
-        )
-
-
-examples = [
-    dspy.Example(
-        local_time="09:30 AM EDT",
-        user_post="Excited for my presentation today!",
-        user_role="presenter",
-        agenda=agenda,
-        social_media_site="LinkedIn",
-        rationale="The post should be professional and optimistic, highlighting the upcoming presentation. We'll use hashtags related to professional growth and presentations. The time suggests it's morning, so we can incorporate that.",
-        post="Good morning, LinkedIn! ☀️ Kicking off a productive day with a team meeting, followed by an exciting client presentation this afternoon. Ready to showcase our latest innovations! #ProfessionalGrowth #ClientPresentation #InnovationInAction",
-    ),
-    dspy.Example(
-        local_time="1:45 PM EDT",
-        user_post="Looking forward to my presentation!",
-        user_role="presenter",
-        agenda=agenda,
-        social_media_site="LinkedIn",
-        rationale="The post should be professional yet engaging, suitable for Instagram. We'll focus on the upcoming presentation, incorporating the user's role as a presenter. The time suggests it's just before the presentation, so we'll emphasize preparation and excitement. We'll use relevant hashtags to increase visibility and engagement.",
-        post="Pre-presentation butterflies! 🦋 Just 15 minutes until I take the stage to share our latest innovations with our valued clients. Months of hard work have led to this moment. Excited to showcase what our amazing team has accomplished! 💼✨ #ProfessionalGrowth #PublicSpeaking #InnovationPresentation #ReadyToInspire",
-    ),
-]
-
-# Create and compile the model
-post_generator = EngagingSocialMediaPost()
-post_generator.generator.demos = examples
 
 
 def get_current_time():
+    import pytz
+
     eastern = pytz.timezone("US/Eastern")
     current_time = datetime.now(eastern)
     return current_time.strftime("%I:%M %p %Z")
@@ -119,6 +102,22 @@ class SocialMediaPostResponse(BaseModel):
     rationale: str
 
 
+class MultiPlatformPostRequest(BaseModel):
+    user_post: str
+    user_role: str
+    social_media_sites: List[str] = Field(min_length=1)
+
+
+class PostVariant(BaseModel):
+    social_media_site: str
+    post: str
+
+
+class MultiPlatformPostResponse(BaseModel):
+    posts: List[PostVariant]
+    rationale: str
+
+
 class ImgGenRequest(BaseModel):
     user_post: str
     negative_prompt: str = (
@@ -132,29 +131,24 @@ class ImgPromptResponse(BaseModel):
     flux_prompt: str
 
 
-class ImgGenSignature(dspy.Signature):
-    user_post = dspy.InputField(desc="the social media post the user wants to make")
-    negative_prompt = dspy.InputField(
-        desc="include this statement to the prompt to avoid generating incorrect images"
-    )
-    extracted_topics = dspy.OutputField(
-        desc="the extracted topics from the user's post relevant to Data and AI. must be specific to databricks. include mosaic ai if user is interested in AI"
-    )
-    flux_prompt = dspy.OutputField(
-        desc="the prompt to be used for generating the image worthy of sharing in social media using flux1 image generation models.Focus on the ambience."
-    )
-
+class GenerateAllRequest(BaseModel):
+    user_post: str
+    user_role: str
+    social_media_site: str
+    generate_image: bool = True
+    generate_recommendations: bool = True
+    negative_prompt: str = ImgGenRequest.model_fields["negative_prompt"].default
+    # Write the post and the image prompt in one LLM call instead of two
+    fused: bool = False
 
-class SocialMediaProcessor(dspy.Module):
-    def __init__(self):
-        super().__init__()
-        self.prompt_generator = dspy.ChainOfThought(ImgGenSignature)
 
-    def forward(self, user_post, negative_prompt):
-        result = self.prompt_generator(
-            user_post=user_post, negative_prompt=negative_prompt
-        )
-        return result
+class GenerateAllResponse(BaseModel):
+    post: str
+    rationale: str
+    extracted_topics: Optional[str] = None
+    flux_prompt: Optional[str] = None
+    image_url: Any = None
+    links: Optional[list] = None
 
 
 class ImgPromptRequest(BaseModel):
@@ -165,12 +159,38 @@ class UserTopicsRequest(BaseModel):
     topics: str
 
 
-def construct_messages_from_search(topics):
-    search_query = f"""databricks blogs and videos related to the following databricks topics {topics}."""
+# Shared between worker processes when CACHE_BACKEND is sqlite
+search_cache = make_cache("search")
+link_cache = make_cache("links")
+prompt_cache = make_cache("image_prompt")
+caches = {"search": search_cache, "links": link_cache, "image_prompt": prompt_cache}
+# Concurrent identical requests share one upstream call
+prompt_calls = SingleFlight("image_prompt")
+image_calls = SingleFlight("image")
+link_calls = SingleFlight("links")
+image_cache = ImageCache() if IMAGE_CACHE else None
+if image_cache is not None:
+    caches["images"] = image_cache
+
+
+def run_search(key):
+    search_query = f"""databricks blogs and videos related to the following databricks topics {", ".join(key)}."""
+    with track("search"):
+        search_results = app.state.search_tool.invoke(search_query)
+    return search_results
 
-    search = DuckDuckGoSearchResults()
-    search_results = search.invoke(search_query)
-    print(search_results)
+
+async def search_topics(topics):
+    key = normalize_topics(topics)
+    search_results = await search_cache.aget(key)
+    if search_results is None:
+        async with limiters["search"].slot():
+            search_results = await run_upstream(run_search, key)
+        await search_cache.aset(key, search_results)
+    return search_results
+
+
+def construct_messages_from_search(search_results):
     messages = [
         {"role": "user", "content": "Hello!"},
         {"role": "assistant", "content": "Hello! How can I assist you today?"},
@@ -183,7 +203,107 @@ def construct_messages_from_search(topics):
     return messages
 
 
-app = FastAPI()
+def start_services(app: FastAPI):
+    import programs
+    from clients import create_async_openai_client
+    from lm_pool import LMPool
+
+    app.state.programs = programs
+    # Temperature is jittered per call (see jittered_temperature) rather than
+    # by building a new LM for every request.
+    # ENDPOINT_NAME doubles as the fallback model for hedging and failover.
+    app.state.lm_pools = {
+        model: LMPool(functools.partial(get_model, model), size=LM_POOL_SIZE)
+        for model in {LM_MODEL, ENDPOINT_NAME}
+        if model
+    }
+    app.state.lm_router = FailoverRouter(LM_MODEL, ENDPOINT_NAME)
+    # Demos embed the agenda, so they are rebuilt whenever agenda.json changes
+    app.state.agenda_store = AgendaStore(build_demos=programs.build_demos)
+    # Compiled demos carry their own reduced agenda, so they don't change with it
+    app.state.compiled_demos = programs.load_compiled_demos()
+    app.state.post_generator = programs.EngagingSocialMediaPost()
+    app.state.variant_generator = programs.MultiPlatformPost()
+    app.state.fused_generator = programs.FusedSocialMediaPost()
+    app.state.image_prompt_generator = programs.SocialMediaProcessor()
+    app.state.openai_client = create_async_openai_client(API_KEY, API_BASE)
+    if getattr(app.state, "search_tool", None) is None:
+        from langchain_community.tools import DuckDuckGoSearchResults
+
+        app.state.search_tool = DuckDuckGoSearchResults()
+
+
+def warm_up():
+    # Opens the first pooled LM connection (TCP + TLS) before real traffic.
+    with app.state.lm_pools[LM_MODEL].lm() as lm:
+        lm.client.chat.completions.create(
+            model=LM_MODEL,
+            messages=[{"role": "user", "content": "ping"}],
+            max_tokens=1,
+        )
+
+
+async def become_ready(app: FastAPI):
+    if WARMUP:
+        try:
+            await run_upstream(warm_up)
+        except Exception as e:
+            print(f"Warm-up call failed: {e}")
+    app.state.startup_timings["ready_seconds"] = round(
+        time.perf_counter() - IMPORT_STARTED, 3
+    )
+    app.state.ready = True
+    print(f"Ready {app.state.startup_timings['ready_seconds']}s after import started")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.ready = False
+    app.state.startup_timings = {
+        "import_seconds": round(IMPORT_FINISHED - IMPORT_STARTED, 3)
+    }
+    await run_upstream(start_services, app)
+    ui_app = None
+    if SERVE_UI:
+        # Importing gradio takes seconds, so it is timed on its own.
+        started = time.perf_counter()
+        await run_upstream(importlib.import_module, "gradio")
+        # The gradio app itself has to be created on the event loop thread.
+        ui_app = mount_ui(app)
+        app.state.startup_timings["ui_seconds"] = round(
+            time.perf_counter() - started, 3
+        )
+    app.state.startup_timings["startup_seconds"] = round(
+        time.perf_counter() - IMPORT_STARTED, 3
+    )
+    app.state.agenda_store.start()
+    if trace_writer is not None:
+        trace_writer.start()
+    app.state.image_jobs = ImageJobStore(
+        create_image,
+        shared=(
+            make_cache("image_jobs", ttl=IMAGE_JOB_RETENTION)
+            if CACHE_BACKEND == "sqlite"
+            else None
+        ),
+    )
+    ready_task = asyncio.create_task(become_ready(app))
+    async with ui_lifespan(ui_app):
+        yield
+    ready_task.cancel()
+    if prefetcher is not None:
+        await prefetcher.close()
+    await app.state.image_jobs.close()
+    app.state.agenda_store.stop()
+    await app.state.openai_client.close()
+    for pool in app.state.lm_pools.values():
+        pool.close()
+    shutdown_upstream_executor()
+    if trace_writer is not None:
+        trace_writer.stop()
+
+
+app = FastAPI(lifespan=lifespan)
 
 
 origins = [
@@ -202,68 +322,708 @@ app.add_middleware(
 )
 
 
+lm_batcher = (
+    MicroBatcher(functools.partial(dispatch_burst, limiter=limiters["lm"]))
+    if LM_BATCHING
+    else None
+)
 
 
+def under_load():
+    return any(limiters[name].busy for name in ("lm", "link_llm", "search"))
 
-@app.post("/generate-social-media-post")
-async def generate_social_media_post(
-    request: SocialMediaPostRequest,
-) -> SocialMediaPostResponse:
-    current_time = get_current_time()
-    with dspy.settings.context(lm=get_model()):
-        response = post_generator(
+
+# After a post, warm the caches the image prompt and links routes read first
+prefetcher = Prefetcher(under_load) if PREFETCH else None
+
+
+async def run_lm(fn, *args):
+    """Run ``fn(model, *args)`` under the route deadline, hedging and failover."""
+
+    async def attempt(model):
+        if lm_batcher is not None:
+            return await lm_batcher.submit(fn, model, *args)
+        return await run_upstream(fn, model, *args)
+
+    # Batched calls take their LM slot when the batch is dispatched.
+    limiter = None if lm_batcher is not None else limiters["lm"]
+    return await app.state.lm_router.call(attempt, limiter=limiter)
+
+
+# Routes where a retried POST with the same Idempotency-Key header gets the
+# stored response instead of running again. All of them return JSON.
+IDEMPOTENT_ROUTES = {
+    "/generate-social-media-post",
+    "/generate-social-media-posts",
+    "/generate-image-prompt-n-get-topics",
+    "/generate-image",
+    "/images",
+    "/get-links-from-topics",
+    "/generate-all",
+}
+idempotency_cache = make_cache("idempotency", ttl=IDEMPOTENCY_TTL)
+idempotent_calls = SingleFlight("idempotency")
+
+
+@app.middleware("http")
+async def replay_idempotent_requests(request: Request, call_next):
+    key = request.headers.get("idempotency-key")
+    if (
+        key is None
+        or request.method != "POST"
+        or request.url.path not in IDEMPOTENT_ROUTES
+    ):
+        return await call_next(request)
+    fingerprint = hashlib.sha256(await request.body()).hexdigest()
+    store_key = f"{request.url.path} {key}"
+
+    async def respond_once():
+        stored = await idempotency_cache.aget(store_key)
+        if stored is not None:
+            return stored
+        response = await call_next(request)
+        record = {
+            "fingerprint": fingerprint,
+            "status": response.status_code,
+            "headers": {
+                name: value
+                for name, value in response.headers.items()
+                if name != "content-length"
+            },
+            "body": b"".join(
+                [chunk async for chunk in response.body_iterator]
+            ).decode(),
+        }
+        # Server errors are worth retrying, so they are not kept
+        if response.status_code < 500:
+            await idempotency_cache.aset(store_key, {**record, "replayed": True})
+        return record
+
+    record = await idempotent_calls.do(store_key, respond_once)
+    if record["fingerprint"] != fingerprint:
+        return JSONResponse(
+            content={"detail": "Idempotency-Key was already used with another body"},
+            status_code=422,
+        )
+    headers = dict(record["headers"])
+    if record.get("replayed"):
+        headers["idempotent-replayed"] = "true"
+    return Response(
+        content=record["body"], status_code=record["status"], headers=headers
+    )
+
+
+trace_writer = tracing.TraceWriter() if tracing.TRACING else None
+profiler = tracing.RequestProfiler()
+
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    if trace_writer is None:
+        return await call_next(request)
+    trace = tracing.Trace(current_route.get())
+    token = tracing.current_trace.set(trace)
+    try:
+        with profiler.maybe_profile(trace):
+            response = await call_next(request)
+    except BaseException:
+        trace_writer.write(trace, 500)
+        raise
+    finally:
+        tracing.current_trace.reset(token)
+    response.headers["x-trace-id"] = trace.id
+    # Streamed bodies (SSE) are still running here; write the trace once the
+    # body is done so spans opened while streaming are in it.
+    response.body_iterator = write_trace_after(
+        response.body_iterator, trace, response.status_code
+    )
+    return response
+
+
+async def write_trace_after(body, trace, status):
+    try:
+        async for chunk in body:
+            yield chunk
+    finally:
+        trace_writer.write(trace, status)
+
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    route = route_template(request.scope)
+    token = current_route.set(route)
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    except Exception:
+        metrics.response_errors.inc(route=route, status="500")
+        metrics.request_latency.observe(time.perf_counter() - start, route=route)
+        raise
+    finally:
+        current_route.reset(token)
+    if response.status_code >= 500:
+        metrics.response_errors.inc(route=route, status=str(response.status_code))
+    # call_next returns once the response starts; streamed bodies (SSE) are
+    # still running, so the latency is observed when the body is done.
+    response.body_iterator = observe_latency_after(response.body_iterator, route, start)
+    return response
+
+
+async def observe_latency_after(body, route, start):
+    try:
+        async for chunk in body:
+            yield chunk
+    except Exception:
+        # The status line has gone out already; count it as a failed response.
+        metrics.response_errors.inc(route=route, status="500")
+        raise
+    finally:
+        metrics.request_latency.observe(time.perf_counter() - start, route=route)
+
+
+def route_template(scope):
+    for route in app.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", "other")
+    return "other"
+
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    return JSONResponse(
+        content={"detail": str(exc)},
+        status_code=503,
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+@app.exception_handler(DeadlineExceeded)
+async def deadline_handler(request: Request, exc: DeadlineExceeded):
+    return JSONResponse(content={"detail": str(exc)}, status_code=504)
+
+
+@app.get("/ready")
+async def ready():
+    return JSONResponse(
+        content={"ready": app.state.ready, **app.state.startup_timings},
+        status_code=200 if app.state.ready else 503,
+    )
+
+
+@app.get("/metrics")
+async def get_metrics():
+    stats = await run_upstream(
+        lambda: {name: cache.stats() for name, cache in caches.items()}
+    )
+    lines = []
+    for metric, kind, field in (
+        ("splash_cache_hits_total", "counter", "hits"),
+        ("splash_cache_misses_total", "counter", "misses"),
+        ("splash_cache_entries", "gauge", "size"),
+    ):
+        lines.append(f"# TYPE {metric} {kind}")
+        lines.extend(
+            f'{metric}{{cache="{name}"}} {cache_stats[field]}'
+            for name, cache_stats in stats.items()
+        )
+    return PlainTextResponse(
+        metrics.render(lines), media_type="text/plain; version=0.0.4"
+    )
+
+
+def post_demos(agenda):
+    if app.state.compiled_demos is not None:
+        return app.state.compiled_demos
+    return agenda.demos
+
+
+def run_post_generator(model, current_time, request: SocialMediaPostRequest):
+    import dspy
+    from lm_pool import jittered_temperature
+
+    agenda = app.state.agenda_store.snapshot
+    agenda_fragment = agenda.prompt_fragment(current_time)
+    lm_pool = app.state.lm_pools[model]
+    with lm_pool.lm() as lm, dspy.settings.context(lm=lm), track("lm"):
+        annotate(agenda_chars=len(agenda_fragment))
+        return app.state.post_generator(
+            local_time=current_time,
+            user_post=request.user_post,
+            user_role=request.user_role,
+            agenda=agenda_fragment,
+            social_media_site=request.social_media_site,
+            config={"temperature": jittered_temperature()},
+            demos=post_demos(agenda),
+        )
+
+
+def run_variant_generator(model, current_time, request: MultiPlatformPostRequest):
+    import dspy
+    from lm_pool import jittered_temperature
+
+    agenda = app.state.agenda_store.snapshot
+    agenda_fragment = agenda.prompt_fragment(current_time)
+    lm_pool = app.state.lm_pools[model]
+    with lm_pool.lm() as lm, dspy.settings.context(lm=lm), track("lm"):
+        annotate(agenda_chars=len(agenda_fragment))
+        return app.state.variant_generator(
             local_time=current_time,
             user_post=request.user_post,
             user_role=request.user_role,
-            agenda=agenda,
+            agenda=agenda_fragment,
+            social_media_sites=request.social_media_sites,
+            config={"temperature": jittered_temperature()},
+        )
+
+
+def run_fused_generator(model, current_time, request: GenerateAllRequest):
+    import dspy
+    from lm_pool import jittered_temperature
+
+    agenda = app.state.agenda_store.snapshot
+    agenda_fragment = agenda.prompt_fragment(current_time)
+    lm_pool = app.state.lm_pools[model]
+    with lm_pool.lm() as lm, dspy.settings.context(lm=lm), track("lm"):
+        annotate(agenda_chars=len(agenda_fragment))
+        return app.state.fused_generator(
+            local_time=current_time,
+            user_post=request.user_post,
+            user_role=request.user_role,
+            agenda=agenda_fragment,
             social_media_site=request.social_media_site,
+            negative_prompt=request.negative_prompt,
+            config={"temperature": jittered_temperature()},
+            demos=app.state.programs.fuse_demos(agenda.demos, request.negative_prompt),
+        )
+
+
+def build_post_prompt(current_time, request: SocialMediaPostRequest):
+    # Render exactly the prompt post_generator would send, so the streamed
+    # completion follows the same template and demos as the blocking route.
+    agenda = app.state.agenda_store.snapshot
+    return app.state.programs.render_prompt(
+        app.state.post_generator.generator,
+        post_demos(agenda),
+        local_time=current_time,
+        user_post=request.user_post,
+        user_role=request.user_role,
+        agenda=agenda.prompt_fragment(current_time),
+        social_media_site=request.social_media_site,
+    )
+
+
+def run_image_prompt_generator(model, request: ImgGenRequest):
+    import dspy
+    from lm_pool import jittered_temperature
+
+    lm_pool = app.state.lm_pools[model]
+    with lm_pool.lm() as lm, dspy.settings.context(lm=lm), track("lm"):
+        return app.state.image_prompt_generator(
+            user_post=request.user_post,
+            negative_prompt=request.negative_prompt,
+            config={"temperature": jittered_temperature()},
         )
+
+
+async def create_post(request: SocialMediaPostRequest) -> SocialMediaPostResponse:
+    current_time = get_current_time()
+    response = await run_lm(run_post_generator, current_time, request)
     return SocialMediaPostResponse(
         post=response.post.split("\n")[0], rationale=response.rationale
     )
 
 
-@app.post("/generate-image-prompt-n-get-topics")
-async def generate_image_prompt_n_get_topics(
-    request: ImgGenRequest,
-) -> ImgPromptResponse:
-    processor = SocialMediaProcessor()
-    with dspy.settings.context(lm=get_model()):
-        response = processor(
-            user_post=request.user_post, negative_prompt=request.negative_prompt
+async def create_post_variants(
+    request: MultiPlatformPostRequest,
+) -> MultiPlatformPostResponse:
+    current_time = get_current_time()
+    response = await run_lm(run_variant_generator, current_time, request)
+    # Parsed outside run_lm: a malformed completion is the model's formatting,
+    # not an endpoint failure, and must not count against the breaker.
+    try:
+        posts = app.state.programs.parse_post_variants(
+            response.posts, request.social_media_sites
         )
-    return ImgPromptResponse(
+    except ValueError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+    return MultiPlatformPostResponse(posts=posts, rationale=response.rationale)
+
+
+async def create_fused(request: GenerateAllRequest):
+    current_time = get_current_time()
+    response = await run_lm(run_fused_generator, current_time, request)
+    post = SocialMediaPostResponse(
+        post=response.post.split("\n")[0], rationale=response.rationale
+    )
+    img_prompt = ImgPromptResponse(
         extracted_topics=response.extracted_topics, flux_prompt=response.flux_prompt
     )
+    # Lets a follow-up /generate-image-prompt-n-get-topics reuse this result
+    await prompt_cache.aset(
+        prompt_key(request.user_post, request.negative_prompt), img_prompt.model_dump()
+    )
+    return post, img_prompt
 
 
-@app.post("/generate-image")
-async def generate_image(request: ImgPromptRequest):
-    output = replicate.run(
-        IMAGE_MODEL_NAME,
-        input={"prompt": request.img_prompt},
-    )
-    return JSONResponse(content={"image_url": output})
+def prompt_key(user_post, negative_prompt):
+    return (user_post.strip(), negative_prompt)
 
 
-@app.post("/get-links-from-topics")
-async def get_links_from_topics(request: UserTopicsRequest):
-    client = OpenAI(
-        api_key=API_KEY,
-        base_url=API_BASE,
+async def create_image_prompt(request: ImgGenRequest) -> ImgPromptResponse:
+    key = prompt_key(request.user_post, request.negative_prompt)
+    return await prompt_calls.do(key, lambda: create_image_prompt_once(key, request))
+
+
+async def create_image_prompt_once(key, request: ImgGenRequest) -> ImgPromptResponse:
+    cached = await prompt_cache.aget(key)
+    if cached is not None:
+        return ImgPromptResponse(**cached)
+    response = await run_lm(run_image_prompt_generator, request)
+    result = ImgPromptResponse(
+        extracted_topics=response.extracted_topics, flux_prompt=response.flux_prompt
     )
-    response = client.chat.completions.create(
-        model=ENDPOINT_NAME,
-        messages=construct_messages_from_search(request.topics),
-        max_tokens=2000,
-        temperature=0.1,
+    await prompt_cache.aset(key, result.model_dump())
+    return result
+
+
+def run_replicate(img_prompt):
+    import replicate
+
+    with track("replicate"):
+        return replicate.run(
+            IMAGE_MODEL_NAME,
+            input={"prompt": img_prompt},
+        )
+
+
+async def create_image(img_prompt):
+    key = image_key(IMAGE_MODEL_NAME, img_prompt)
+    return await image_calls.do(key, lambda: create_image_once(key, img_prompt))
+
+
+async def create_image_once(key, img_prompt):
+    if image_cache is None:
+        async with limiters["replicate"].slot():
+            return await run_upstream(run_replicate, img_prompt)
+    cached = await run_upstream(image_cache.lookup, key)
+    if cached is not None:
+        return cached
+    async with limiters["replicate"].slot():
+        output = await run_upstream(run_replicate, img_prompt)
+    try:
+        with track("image_download"):
+            return await run_upstream(image_cache.store, key, output)
+    except Exception as e:
+        # Fall back to the remote URL rather than failing the request.
+        print(f"Caching image for {img_prompt!r} failed: {e}")
+        return output
+
+
+async def extract_links_with_llm(search_results):
+    client = app.state.openai_client.with_options(
+        timeout=LINKS_TIMEOUT, max_retries=LINKS_MAX_RETRIES
     )
+    messages = construct_messages_from_search(search_results)
+    async with limiters["link_llm"].slot():
+        with track("link_llm"):
+            annotate(prompt_chars=sum(len(m["content"]) for m in messages))
+            response = await client.chat.completions.create(
+                model=ENDPOINT_NAME,
+                messages=messages,
+                max_tokens=2000,
+                temperature=0.1,
+            )
+    if response.usage is not None:
+        record_usage(response.usage.model_dump(), ENDPOINT_NAME)
     json_response = response.choices[0].message.content
-    result = json.loads(
+    return json.loads(
         json_response[json_response.find("[") : json_response.find("]") + 1].strip("\n")
     )
+
+
+async def find_links(topics):
+    key = normalize_topics(topics)
+    return await link_calls.do(key, lambda: find_links_once(key, topics))
+
+
+async def find_links_once(key, topics):
+    links = await link_cache.aget(key)
+    if links is not None:
+        return links
+    search_results = await search_topics(topics)
+    with track("link_parse"):
+        links = extract_links(search_results)
+    if not links:
+        # The search result format changed or came back empty; let the LLM try.
+        links = await extract_links_with_llm(search_results)
+    await link_cache.aset(key, links)
+    return links
+
+
+@app.post("/generate-social-media-post")
+async def generate_social_media_post(
+    request: SocialMediaPostRequest,
+) -> SocialMediaPostResponse:
+    response = await create_post(request)
+    start_prefetch(request.user_post)
+    return response
+
+
+def start_prefetch(user_post):
+    if prefetcher is not None:
+        prefetcher.start(user_post, lambda: prefetch_follow_ups(user_post))
+
+
+async def prefetch_follow_ups(user_post):
+    # Same work, keys and caches as the image prompt and links routes, so a
+    # follow-up request either hits the cache or joins the call in flight.
+    img_prompt = await create_image_prompt(ImgGenRequest(user_post=user_post))
+    await find_links(img_prompt.extracted_topics)
+
+
+@app.post("/generate-social-media-posts")
+async def generate_social_media_posts(
+    request: MultiPlatformPostRequest,
+) -> MultiPlatformPostResponse:
+    # One completion and one agenda payload for all the requested sites.
+    return await create_post_variants(request)
+
+
+@app.post("/generate-social-media-post/stream")
+async def stream_social_media_post(request: SocialMediaPostRequest):
+    from lm_pool import jittered_temperature
+
+    prompt = build_post_prompt(get_current_time(), request)
+    # The LM slot is held until the stream ends, so admission happens here,
+    # before the response starts, and the slot is released by events().
+    await limiters["lm"].acquire()
+    model = app.state.lm_router.pick()
+    try:
+        stream = await app.state.openai_client.chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": "You are a helpful assistant."},
+                {"role": "user", "content": prompt},
+            ],
+            max_tokens=2000,
+            temperature=jittered_temperature(),
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+    except BaseException:
+        limiters["lm"].release()
+        app.state.lm_router.record(model, ok=False)
+        raise
+    app.state.lm_router.record(model, ok=True)
+
+    async def events():
+        post = ""
+        # Closing the stream early means the endpoint's usage chunk never
+        # comes; the completion tokens are then the content chunks received.
+        usage = {}
+        try:
+            with track("lm"):
+                try:
+                    deltas = chat_deltas(stream, usage)
+                    async for text in stream_field_line(deltas, "Post:"):
+                        post += text
+                        yield sse_event("token", {"text": text})
+                finally:
+                    record_usage(usage, model)
+            yield sse_event("done", {"post": post})
+            start_prefetch(request.user_post)
+        finally:
+            # Closing the response stops the upstream generation once the
+            # post line is complete or the client goes away.
+            await stream.close()
+            limiters["lm"].release()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
+
+
+@app.post("/generate-image-prompt-n-get-topics")
+async def generate_image_prompt_n_get_topics(
+    request: ImgGenRequest,
+) -> ImgPromptResponse:
+    return await create_image_prompt(request)
+
+
+def public_image_url(output, http_request: Optional[Request]):
+    """Make the image cache's relative URLs absolute for the client."""
+    if image_cache is None or http_request is None:
+        return output
+    return image_cache.absolute(output, str(http_request.base_url))
+
+
+@app.post("/generate-image")
+async def generate_image(request: ImgPromptRequest, http_request: Request):
+    output = await create_image(request.img_prompt)
+    return JSONResponse(content={"image_url": public_image_url(output, http_request)})
+
+
+@app.get(IMAGE_FILES_PATH + "/{name}")
+async def get_image_file(name: str):
+    path = await run_upstream(image_cache.path, name) if image_cache else None
+    if path is None:
+        raise HTTPException(status_code=404, detail="Unknown image")
+    # Names are content-addressed, so a name never points at different bytes.
+    return FileResponse(
+        path, headers={"Cache-Control": "public, max-age=31536000, immutable"}
+    )
+
+
+@app.post("/images", status_code=202)
+async def submit_image_job(request: ImgPromptRequest):
+    job = await app.state.image_jobs.submit(request.img_prompt)
+    return job.to_dict()
+
+
+@app.get("/images/{job_id}")
+async def get_image_job(job_id: str, http_request: Request, wait: float = 0):
+    job = app.state.image_jobs.get(job_id)
+    if job is None:
+        # Submitted to another worker process
+        state = await app.state.image_jobs.get_shared(job_id)
+        if state is None:
+            raise HTTPException(status_code=404, detail="Unknown image job")
+        finished = state["status"] not in ("pending", "running")
+    else:
+        if wait > 0:
+            await app.state.image_jobs.wait(job, wait)
+        state = job.to_dict()
+        finished = job.done.is_set()
+    state["image_url"] = public_image_url(state["image_url"], http_request)
+    return JSONResponse(content=state, status_code=200 if finished else 202)
+
+
+@app.post("/get-links-from-topics")
+async def get_links_from_topics(request: UserTopicsRequest):
+    result = await find_links(request.topics)
     return JSONResponse(content=result)
 
 
+@app.post("/generate-all")
+async def generate_all(
+    request: GenerateAllRequest, http_request: Request = None
+) -> GenerateAllResponse:
+    # The post and the image prompt only depend on user_post, so they start
+    # together; the image and the links each start as soon as the prompt is in.
+    needs_prompt = request.generate_image or request.generate_recommendations
+    prompt_task = image_task = links_task = None
+    if request.fused and needs_prompt:
+        fused_task = asyncio.create_task(create_fused(request))
+
+        async def post_from_fused():
+            return (await fused_task)[0]
+
+        async def prompt_from_fused():
+            return (await fused_task)[1]
+
+        post_task = asyncio.create_task(post_from_fused())
+        prompt_task = asyncio.create_task(prompt_from_fused())
+        tasks = [fused_task, post_task, prompt_task]
+    else:
+        post_task = asyncio.create_task(
+            create_post(
+                SocialMediaPostRequest(
+                    user_post=request.user_post,
+                    user_role=request.user_role,
+                    social_media_site=request.social_media_site,
+                )
+            )
+        )
+        tasks = [post_task]
+        if needs_prompt:
+            prompt_task = asyncio.create_task(
+                create_image_prompt(
+                    ImgGenRequest(
+                        user_post=request.user_post,
+                        negative_prompt=request.negative_prompt,
+                    )
+                )
+            )
+            tasks.append(prompt_task)
+
+    if prompt_task is not None:
+
+        async def image_after_prompt():
+            return await create_image((await prompt_task).flux_prompt)
+
+        async def links_after_prompt():
+            return await find_links((await prompt_task).extracted_topics)
+
+        if request.generate_image:
+            image_task = asyncio.create_task(image_after_prompt())
+            tasks.append(image_task)
+        if request.generate_recommendations:
+            links_task = asyncio.create_task(links_after_prompt())
+            tasks.append(links_task)
+
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
+    post = post_task.result()
+    response = GenerateAllResponse(post=post.post, rationale=post.rationale)
+    if prompt_task is not None:
+        img_prompt = prompt_task.result()
+        response.extracted_topics = img_prompt.extracted_topics
+        response.flux_prompt = img_prompt.flux_prompt
+    if image_task is not None:
+        response.image_url = public_image_url(image_task.result(), http_request)
+    if links_task is not None:
+        response.links = links_task.result()
+    return response
+
+
+async def run_pipeline(**fields) -> GenerateAllResponse:
+    # No HTTP request here, so cached images keep the relative URLs the UI
+    # resolves to local files.
+    return await generate_all(GenerateAllRequest(**fields))
+
+
+def mount_ui(app):
+    import gradio as gr
+    from ui import build_demo
+
+    lifespan_context = app.router.lifespan_context
+    gr.mount_gradio_app(
+        app,
+        build_demo(
+            run_pipeline,
+            resolve_image=image_cache.local_path if image_cache else None,
+        ),
+        path=UI_PATH,
+        show_error=True,
+    )
+    # mount_gradio_app starts the UI by wrapping the app's lifespan, which is
+    # already running by now; ui_lifespan does that part instead.
+    app.router.lifespan_context = lifespan_context
+    return app.routes[-1].app
+
+
+@asynccontextmanager
+async def ui_lifespan(ui_app):
+    if ui_app is None:
+        yield
+        return
+    async with ui_app.router.lifespan_context(ui_app):
+        ui_app.get_blocks().startup_events()
+        yield
+
+
+IMPORT_FINISHED = time.perf_counter()
+
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # Worker processes import the app themselves, so it is passed by name
+    uvicorn.run(
+        app if WORKERS == 1 else "app:app", host="0.0.0.0", port=8000, workers=WORKERS
+    )
@@ -0,0 +1,92 @@
+import asyncio
+import contextvars
+import functools
+import os
+
+from upstream import run_upstream
+
+LM_BATCHING = os.getenv("LM_BATCHING", "false").lower() in ("1", "true", "yes")
+LM_BATCH_MAX_SIZE = int(os.getenv("LM_BATCH_MAX_SIZE", "16"))
+LM_BATCH_MAX_WAIT_MS = float(os.getenv("LM_BATCH_MAX_WAIT_MS", "20"))
+
+
+async def dispatch_burst(calls, limiter=None):
+    """Send a batch as one concurrent burst of individual upstream calls.
+
+    Databricks chat serving endpoints take one conversation per request, so
+    this is the dispatch used for LM calls. Each call takes its own slot from
+    ``limiter`` once the batch is flushed, in its submitter's context so the
+    submitting route's admission settings apply. A dispatch for an endpoint
+    with batch input would send ``calls`` in one request instead; until one
+    exists LM_BATCHING only adds up to LM_BATCH_MAX_WAIT_MS of latency per call.
+    """
+
+    async def run(call):
+        if limiter is None:
+            return await run_upstream(call)
+        async with limiter.slot():
+            return await run_upstream(call)
+
+    tasks = [asyncio.create_task(run(call), context=context) for call, context in calls]
+    return await asyncio.gather(*tasks, return_exceptions=True)
+
+
+class MicroBatcher:
+    """Collects calls for up to ``max_wait`` seconds or ``max_size`` calls.
+
+    Each batch is handed to ``dispatch`` as a list of (zero-argument callable,
+    submitter's context) pairs; it returns one result or exception per call,
+    in order. Each result is
+    handed back to the caller that submitted it.
+    """
+
+    def __init__(
+        self,
+        dispatch=dispatch_burst,
+        max_size=LM_BATCH_MAX_SIZE,
+        max_wait=LM_BATCH_MAX_WAIT_MS / 1000,
+    ):
+        self.dispatch = dispatch
+        self.max_size = max_size
+        self.max_wait = max_wait
+        self._pending = []
+        self._timer = None
+        self._inflight = set()
+
+    async def submit(self, fn, *args, **kwargs):
+        future = asyncio.get_running_loop().create_future()
+        # Run each call in its submitter's context, not the flushing task's.
+        call = functools.partial(fn, *args, **kwargs)
+        self._pending.append((call, contextvars.copy_context(), future))
+        if len(self._pending) >= self.max_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(
+                self.max_wait, self._flush
+            )
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._run(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _run(self, batch):
+        try:
+            results = await self.dispatch(
+                [(call, context) for call, context, _ in batch]
+            )
+        except Exception as e:
+            results = [e] * len(batch)
+        for (_, _, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
@@ -0,0 +1,40 @@
+import os
+
+import httpx
+from openai import AsyncOpenAI, OpenAI
+
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "100"))
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(
+    os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "20")
+)
+OPENAI_KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "30"))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+
+
+def openai_limits():
+    return httpx.Limits(
+        max_connections=OPENAI_MAX_CONNECTIONS,
+        max_keepalive_connections=OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY,
+    )
+
+
+def create_openai_client(api_key, base_url):
+    return OpenAI(
+        api_key=api_key,
+        base_url=base_url,
+        timeout=OPENAI_TIMEOUT,
+        max_retries=OPENAI_MAX_RETRIES,
+        http_client=httpx.Client(limits=openai_limits(), timeout=OPENAI_TIMEOUT),
+    )
+
+
+def create_async_openai_client(api_key, base_url):
+    return AsyncOpenAI(
+        api_key=api_key,
+        base_url=base_url,
+        timeout=OPENAI_TIMEOUT,
+        max_retries=OPENAI_MAX_RETRIES,
+        http_client=httpx.AsyncClient(limits=openai_limits(), timeout=OPENAI_TIMEOUT),
+    )
@@ -0,0 +1,150 @@
+"""Compile the post generator's few-shot demos offline.
+
+Runs dspy's BootstrapFewShot over a small labeled set (demos/trainset.jsonl)
+and writes the demos that pass the metric to a versioned JSON artifact that
+app.py loads at startup from DEMOS_PATH. Each demo's agenda is cut down to
+the one session it is about, instead of the agenda fragment the live prompt
+carries.
+
+    python src/compile_demos.py
+    python src/compile_demos.py --labeled-only   # no LLM calls
+
+Uses API_BASE / API_KEY like the service. Each run writes
+post_demos.v<N>.json next to the output and updates the output itself.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+from datetime import datetime, timezone
+
+import dspy
+from dotenv import load_dotenv
+from dspy.teleprompt import BootstrapFewShot, LabeledFewShot
+
+import programs
+from agenda_index import AgendaStore
+from lm_pool import PooledDatabricks
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+TRAINSET_PATH = os.path.join(HERE, "demos", "trainset.jsonl")
+INPUTS = ("local_time", "user_post", "user_role", "agenda", "social_media_site")
+# Rough upper bounds on post length per site
+SITE_LIMITS = {"LinkedIn": 3000, "Facebook": 2000, "Instagram": 2200}
+
+
+def load_trainset(path, agenda_index):
+    examples = []
+    with open(path) as file:
+        for line in file:
+            if line.strip():
+                row = json.loads(line)
+                row["agenda"] = agenda_index.prompt_fragment(row["local_time"])
+                examples.append(dspy.Example(**row).with_inputs(*INPUTS))
+    return examples
+
+
+def post_metric(example, pred, trace=None):
+    """A post is usable if its first line has hashtags, fits the site's
+    length limit and the prediction picks the labeled session (or none)."""
+    post = pred.post.split("\n")[0].strip()
+    if not post or "#" not in post:
+        return False
+    if len(post) > SITE_LIMITS.get(example.social_media_site, 2000):
+        return False
+    predicted = (pred.current_session or "").lower()
+    session = example.get("current_session", "None")
+    if session == "None":
+        return "none" in predicted
+    return session.lower() in predicted
+
+
+def compile_demos(trainset, max_demos, labeled_only):
+    student = programs.EngagingSocialMediaPost()
+    if labeled_only:
+        optimizer = LabeledFewShot(k=max_demos)
+        compiled = optimizer.compile(student, trainset=trainset, sample=False)
+    else:
+        optimizer = BootstrapFewShot(
+            metric=post_metric,
+            max_bootstrapped_demos=max_demos,
+            max_labeled_demos=max_demos,
+        )
+        compiled = optimizer.compile(student, trainset=trainset)
+    return type(optimizer).__name__, compiled.generator.demos
+
+
+def next_version(out):
+    if not os.path.exists(out):
+        return 1
+    with open(out) as file:
+        return json.load(file).get("version", 0) + 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--trainset", default=TRAINSET_PATH)
+    parser.add_argument("--out", default=programs.DEMOS_PATH)
+    parser.add_argument("--model", default="sg-external")
+    parser.add_argument("--max-demos", type=int, default=2)
+    parser.add_argument(
+        "--labeled-only",
+        action="store_true",
+        help="Use the labeled posts as demos without bootstrapping through the LLM",
+    )
+    args = parser.parse_args()
+
+    load_dotenv()
+    agenda_index = AgendaStore().snapshot.index
+    trainset = load_trainset(args.trainset, agenda_index)
+    if not args.labeled_only:
+        dspy.settings.configure(
+            lm=PooledDatabricks(
+                model=args.model,
+                model_type="chat",
+                api_key=os.getenv("API_KEY"),
+                api_base=os.getenv("API_BASE"),
+                max_tokens=2000,
+                temperature=0.7,
+            )
+        )
+    optimizer, demos = compile_demos(trainset, args.max_demos, args.labeled_only)
+
+    fields = set(programs.SocialMediaPostGenerator.fields) | {"augmented"}
+    compact = []
+    for demo in demos:
+        demo = {k: v for k, v in demo.toDict().items() if k in fields}
+        demo["agenda"] = programs.session_agenda(
+            agenda_index, demo["local_time"], demo.get("current_session")
+        )
+        compact.append(demo)
+
+    with open(args.trainset, "rb") as file:
+        trainset_sha256 = hashlib.sha256(file.read()).hexdigest()
+    version = next_version(args.out)
+    artifact = {
+        "version": version,
+        "signature": programs.SocialMediaPostGenerator.__name__,
+        "optimizer": optimizer,
+        "model": None if args.labeled_only else args.model,
+        "compiled_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "trainset_sha256": trainset_sha256,
+        "demos": compact,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    root, ext = os.path.splitext(args.out)
+    versioned = f"{root}.v{version}{ext}"
+    with open(versioned, "w") as file:
+        json.dump(artifact, file, indent=2, ensure_ascii=False)
+    shutil.copyfile(versioned, args.out)
+    prompt_chars = sum(len(json.dumps(demo, ensure_ascii=False)) for demo in compact)
+    print(
+        f"Wrote {len(compact)} demos ({prompt_chars} chars) to {versioned} "
+        f"and {args.out}"
+    )
+
+
+if __name__ == "__main__":
+    main()
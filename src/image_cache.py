@@ -0,0 +1,185 @@
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import tempfile
+import threading
+from urllib.parse import urlparse
+
+from tracing import record_cache
+
+IMAGE_CACHE = os.getenv("IMAGE_CACHE", "true").lower() in ("1", "true", "yes")
+IMAGE_CACHE_DIR = os.getenv(
+    "IMAGE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "splash-images")
+)
+IMAGE_CACHE_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MAX_BYTES", str(1024**3)))
+IMAGE_DOWNLOAD_TIMEOUT = float(os.getenv("IMAGE_DOWNLOAD_TIMEOUT", "30"))
+# Route the cached files are served from, and an optional absolute prefix
+# (e.g. https://splash.example.com) for the URLs handed back to clients.
+# Without it, routes make them absolute against the request's base URL.
+IMAGE_FILES_PATH = "/image-files"
+IMAGE_PUBLIC_URL = os.getenv("IMAGE_PUBLIC_URL", "").rstrip("/")
+
+NAME_PATTERN = re.compile(r"^[0-9a-f]{64}-\d+\.\w+$")
+
+
+def normalize_prompt(prompt):
+    return " ".join(prompt.split())
+
+
+def image_key(model, prompt):
+    """Content address of an image request: hash of model + normalized prompt."""
+    return hashlib.sha256(
+        f"{model}\n{normalize_prompt(prompt)}".encode("utf-8")
+    ).hexdigest()
+
+
+class ImageCache:
+    """Generated images, downloaded once and kept on local disk.
+
+    Each key owns its image files (``<key>-<n>.<ext>``) plus a small
+    ``<key>.json`` manifest recording the shape of the original output.
+    Reads bump the files' mtime and the directory is trimmed to ``max_bytes``
+    by evicting whole keys, least recently used first. Files are written
+    atomically, so several worker processes can share one directory.
+    """
+
+    def __init__(
+        self,
+        directory=IMAGE_CACHE_DIR,
+        max_bytes=IMAGE_CACHE_MAX_BYTES,
+        base_url=IMAGE_PUBLIC_URL,
+    ):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.base_url = base_url
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def url(self, name):
+        return f"{self.base_url}{IMAGE_FILES_PATH}/{name}"
+
+    def absolute(self, output, base_url):
+        """``output`` (a URL or list of URLs) with this cache's relative URLs
+        made absolute against ``base_url``."""
+        prefix = base_url.rstrip("/")
+
+        def absolute_url(url):
+            if isinstance(url, str) and url.startswith(f"{IMAGE_FILES_PATH}/"):
+                return prefix + url
+            return url
+
+        if isinstance(output, list):
+            return [absolute_url(url) for url in output]
+        return absolute_url(output)
+
+    def path(self, name):
+        """Local path of a cached file, or None. Counts as a read for LRU."""
+        if not NAME_PATTERN.match(name):
+            return None
+        path = os.path.join(self.directory, name)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def local_path(self, url):
+        """Local path for a URL returned by this cache, or None."""
+        prefix = self.url("")
+        if not isinstance(url, str) or not url.startswith(prefix):
+            return None
+        return self.path(url[len(prefix) :])
+
+    def lookup(self, key):
+        """URLs for ``key`` in the shape replicate returned them, or None."""
+        manifest = os.path.join(self.directory, f"{key}.json")
+        try:
+            with open(manifest) as file:
+                entry = json.load(file)
+            for name in entry["names"]:
+                os.utime(os.path.join(self.directory, name))
+            os.utime(manifest)
+        except (OSError, ValueError, KeyError):
+            self._count(hit=False)
+            return None
+        self._count(hit=True)
+        urls = [self.url(name) for name in entry["names"]]
+        return urls if entry["list"] else urls[0]
+
+    def store(self, key, output):
+        """Download replicate ``output`` (a URL or list of URLs) under ``key``."""
+        import httpx
+
+        sources = output if isinstance(output, list) else [output]
+        names = []
+        with httpx.Client(timeout=IMAGE_DOWNLOAD_TIMEOUT) as client:
+            for i, source in enumerate(sources):
+                response = client.get(str(source))
+                response.raise_for_status()
+                name = f"{key}-{i}{self._extension(str(source), response)}"
+                self._write(name, response.content)
+                names.append(name)
+        self._write(
+            f"{key}.json",
+            json.dumps({"names": names, "list": isinstance(output, list)}).encode(),
+        )
+        self.evict(keep=key)
+        urls = [self.url(name) for name in names]
+        return urls if isinstance(output, list) else urls[0]
+
+    def evict(self, keep=None):
+        """Trim the directory to ``max_bytes``, never evicting key ``keep``
+        (the one just stored, whose URLs are about to be handed out)."""
+        groups = {}
+        for entry in os.scandir(self.directory):
+            if not entry.is_file() or entry.name.startswith("."):
+                continue
+            stat = entry.stat()
+            key = entry.name.split("-")[0].split(".")[0]
+            size, used, paths = groups.get(key, (0, 0, []))
+            groups[key] = (
+                size + stat.st_size,
+                max(used, stat.st_mtime),
+                paths + [entry.path],
+            )
+        total = sum(size for size, _, _ in groups.values())
+        groups.pop(keep, None)
+        for size, _, paths in sorted(groups.values(), key=lambda group: group[1]):
+            if total <= self.max_bytes:
+                break
+            for path in paths:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= size
+
+    def stats(self):
+        size = sum(1 for name in os.listdir(self.directory) if name.endswith(".json"))
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": size}
+
+    def _count(self, hit):
+        record_cache("images", hit)
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def _extension(self, source, response):
+        ext = os.path.splitext(urlparse(source).path)[1]
+        if re.match(r"^\.\w+$", ext):
+            return ext
+        content_type = response.headers.get("content-type", "").split(";")[0]
+        return mimetypes.guess_extension(content_type) or ".bin"
+
+    def _write(self, name, data):
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix=".")
+        with os.fdopen(fd, "wb") as file:
+            file.write(data)
+        os.replace(tmp, os.path.join(self.directory, name))
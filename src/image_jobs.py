@@ -0,0 +1,116 @@
+import asyncio
+import os
+import time
+import uuid
+
+IMAGE_JOB_WORKERS = int(os.getenv("IMAGE_JOB_WORKERS", "8"))
+IMAGE_JOB_RETENTION = float(os.getenv("IMAGE_JOB_RETENTION", "3600"))
+IMAGE_JOB_MAX_WAIT = float(os.getenv("IMAGE_JOB_MAX_WAIT", "60"))
+
+
+class ImageJob:
+    def __init__(self, img_prompt):
+        self.id = uuid.uuid4().hex
+        self.img_prompt = img_prompt
+        self.status = "pending"
+        self.image_url = None
+        self.error = None
+        self.finished_at = None
+        self.done = asyncio.Event()
+        self.task = None
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "status": self.status,
+            "image_url": self.image_url,
+            "error": self.error,
+        }
+
+
+class ImageJobStore:
+    """Runs image generations in the background and keeps finished results.
+
+    At most ``workers`` generations run at once; the rest wait as pending.
+    Finished jobs are dropped ``retention`` seconds after they complete.
+    With a ``shared`` cache, job states are also published there so any
+    worker process can answer a poll for a job another worker is running.
+    """
+
+    def __init__(
+        self,
+        generate,
+        workers=IMAGE_JOB_WORKERS,
+        retention=IMAGE_JOB_RETENTION,
+        shared=None,
+    ):
+        self.generate = generate
+        self.retention = retention
+        self.shared = shared
+        self._slots = asyncio.Semaphore(workers)
+        self._jobs = {}
+
+    async def submit(self, img_prompt):
+        self.prune()
+        job = ImageJob(img_prompt)
+        self._jobs[job.id] = job
+        # Published before the job starts, so it cannot overwrite the result
+        await self._publish(job)
+        job.task = asyncio.create_task(self._run(job))
+        return job
+
+    def get(self, job_id):
+        self.prune()
+        return self._jobs.get(job_id)
+
+    async def get_shared(self, job_id):
+        """Last published state of a job owned by another worker, or None."""
+        if self.shared is None:
+            return None
+        return await self.shared.aget(job_id)
+
+    async def _publish(self, job):
+        if self.shared is not None:
+            await self.shared.aset(job.id, job.to_dict())
+
+    async def wait(self, job, timeout):
+        try:
+            await asyncio.wait_for(job.done.wait(), min(timeout, IMAGE_JOB_MAX_WAIT))
+        except asyncio.TimeoutError:
+            pass
+        return job
+
+    def prune(self):
+        cutoff = time.monotonic() - self.retention
+        expired = [
+            job_id
+            for job_id, job in self._jobs.items()
+            if job.finished_at is not None and job.finished_at < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    async def close(self):
+        tasks = [job.task for job in self._jobs.values() if job.task is not None]
+        for task in tasks:
+            task.cancel()
+        # Let them publish their final state while the executor is still up
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._jobs.clear()
+
+    async def _run(self, job):
+        try:
+            async with self._slots:
+                job.status = "running"
+                job.image_url = await self.generate(job.img_prompt)
+                job.status = "succeeded"
+        except asyncio.CancelledError:
+            job.status = "cancelled"
+            raise
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = time.monotonic()
+            job.done.set()
+            await self._publish(job)
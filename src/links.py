@@ -0,0 +1,21 @@
+import re
+from urllib.parse import urlparse
+
+# DuckDuckGoSearchResults renders each hit as
+# "[snippet: ..., title: ..., link: https://..., date: ..., source: ...]"
+LINK_PATTERN = re.compile(r"link:\s*(https?://[^\s\]]+)")
+
+
+def is_databricks_link(link):
+    host = urlparse(link).netloc.lower().split(":")[0]
+    return host == "databricks.com" or host.endswith(".databricks.com")
+
+
+def extract_links(search_results):
+    """Deduplicated links from search results text, databricks.com domains first."""
+    links = list(
+        dict.fromkeys(
+            match.rstrip(",.;") for match in LINK_PATTERN.findall(search_results)
+        )
+    )
+    return sorted(links, key=lambda link: not is_databricks_link(link))
@@ -0,0 +1,119 @@
+import queue
+import random
+import threading
+from contextlib import contextmanager
+
+import dspy
+from clients import create_openai_client
+from metrics import record_usage
+from tracing import annotate
+
+# Long-lived LMs append every call to ``history``; keep only the tail.
+MAX_HISTORY = 20
+
+
+def jittered_temperature(base=0.7):
+    return round(base + (random.randint(1, 100) / 10000), 4)
+
+
+class PooledDatabricks(dspy.Databricks):
+    """dspy.Databricks that sends chat requests through its own OpenAI client.
+
+    The stock Databricks LM creates a fresh OpenAI client, and with it a fresh
+    connection pool, on every request. This one keeps a single client for its
+    lifetime so connections to the serving endpoint stay alive between calls.
+    """
+
+    def __init__(self, model, api_key=None, api_base=None, **kwargs):
+        super().__init__(model=model, api_key=api_key, api_base=api_base, **kwargs)
+        self.client = create_openai_client(api_key, api_base)
+
+    def request(self, prompt: str, **kwargs):
+        # GPT3.request retries rate limits with backoff for up to 1000s, all
+        # the while holding the caller's LM slot, pooled LM and executor
+        # thread after the route deadline has given up on it. The client's
+        # own bounded max_retries (OPENAI_MAX_RETRIES) is the only retry here.
+        kwargs.pop("model_type", None)
+        return self.basic_request(prompt, **kwargs)
+
+    def basic_request(self, prompt: str, **kwargs):
+        if self.model_type != "chat":
+            return super().basic_request(prompt, **kwargs)
+
+        raw_kwargs = kwargs
+        kwargs = {**self.kwargs, **kwargs}
+        kwargs["messages"] = [
+            {"role": "system", "content": "You are a helpful assistant."},
+            {"role": "user", "content": prompt},
+        ]
+        annotate(prompt_chars=len(prompt))
+        response = self.client.chat.completions.create(**kwargs).model_dump()
+        record_usage(response.get("usage"), kwargs["model"])
+
+        self.history.append(
+            {
+                "prompt": prompt,
+                "response": response,
+                "kwargs": kwargs,
+                "raw_kwargs": raw_kwargs,
+            }
+        )
+        del self.history[:-MAX_HISTORY]
+        return response
+
+
+class LMPool:
+    """Fixed-size pool of LM instances, created lazily and checked out per call."""
+
+    def __init__(self, factory, size):
+        self.factory = factory
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._closed = False
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def lm(self):
+        lm = self._checkout()
+        try:
+            yield lm
+        finally:
+            if self._closed:
+                self._close_lm(lm)
+            else:
+                self._idle.put(lm)
+
+    def close(self):
+        """Close the idle LMs' HTTP clients; checked-out ones close on return."""
+        self._closed = True
+        while True:
+            try:
+                lm = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._close_lm(lm)
+
+    @staticmethod
+    def _close_lm(lm):
+        client = getattr(lm, "client", None)
+        if client is not None:
+            client.close()
+
+    def _checkout(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            create = self._created < self.size
+            if create:
+                self._created += 1
+        if create:
+            try:
+                return self.factory()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        return self._idle.get()
@@ -0,0 +1,160 @@
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+import tracing
+
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+# Route template of the request being served, e.g. "/generate-all". Set by
+# the app's middleware and carried into executor threads by run_upstream.
+current_route = contextvars.ContextVar("current_route", default="")
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    pairs = ",".join(f'{name}="{value}"' for name, value in labels)
+    return "{" + pairs + "}"
+
+
+class Metric:
+    def __init__(self, name, help, kind):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    def __init__(self, name, help):
+        super().__init__(name, help, "counter")
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [
+            f"{self.name}{format_labels(key)} {value}" for key, value in items
+        ]
+
+
+class Gauge(Counter):
+    def __init__(self, name, help):
+        Metric.__init__(self, name, help, "gauge")
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    def __init__(self, name, help, buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, "histogram")
+        self.buckets = buckets
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._values.setdefault(
+                key, {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            )
+            idx = bisect.bisect_left(self.buckets, value)
+            if idx < len(self.buckets):
+                series["buckets"][idx] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self):
+        with self._lock:
+            items = sorted(
+                (key, {**series, "buckets": list(series["buckets"])})
+                for key, series in self._values.items()
+            )
+        lines = self.header()
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series["buckets"]):
+                cumulative += count
+                labels = format_labels(key + (("le", bound),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = format_labels(key + (("le", "+Inf"),))
+            lines.append(f"{self.name}_bucket{labels} {series['count']}")
+            lines.append(f"{self.name}_sum{format_labels(key)} {series['sum']}")
+            lines.append(f"{self.name}_count{format_labels(key)} {series['count']}")
+        return lines
+
+
+stage_latency = Histogram(
+    "splash_stage_latency_seconds", "Latency of each pipeline stage."
+)
+request_latency = Histogram(
+    "splash_request_latency_seconds", "Total request latency by route."
+)
+inflight = Gauge("splash_upstream_inflight", "Calls currently in flight per stage.")
+stage_errors = Counter("splash_stage_errors_total", "Failed stage calls by stage.")
+response_errors = Counter(
+    "splash_response_errors_total", "5xx responses by route and status."
+)
+tokens = Counter(
+    "splash_tokens_total", "Prompt and completion tokens by endpoint and route."
+)
+registry = [
+    stage_latency,
+    request_latency,
+    inflight,
+    stage_errors,
+    response_errors,
+    tokens,
+]
+
+
+@contextmanager
+def track(stage):
+    """Time a stage, count it as in flight and count it as an error if it raises.
+
+    Also records the stage as a span of the current trace when tracing is on.
+    """
+    inflight.inc(stage=stage)
+    start = time.perf_counter()
+    try:
+        with tracing.span(stage):
+            yield
+    except BaseException:
+        stage_errors.inc(stage=stage)
+        raise
+    finally:
+        stage_latency.observe(time.perf_counter() - start, stage=stage)
+        inflight.dec(stage=stage)
+
+
+def record_usage(usage, model):
+    """Count tokens from an OpenAI-style ``usage`` dict against the current route."""
+    if not usage:
+        return
+    route = current_route.get()
+    tracing.annotate(
+        model=model,
+        prompt_tokens=usage.get("prompt_tokens"),
+        completion_tokens=usage.get("completion_tokens"),
+    )
+    for kind in ("prompt_tokens", "completion_tokens"):
+        if usage.get(kind):
+            tokens.inc(usage[kind], route=route, model=model, kind=kind.split("_")[0])
+
+
+def render(extra_lines=()):
+    lines = []
+    for metric in registry:
+        lines.extend(metric.render())
+    lines.extend(extra_lines)
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,73 @@
+import asyncio
+import os
+
+import tracing
+from metrics import Counter, current_route, registry
+
+PREFETCH = os.getenv("PREFETCH", "false").lower() in ("1", "true", "yes")
+PREFETCH_CONCURRENCY = int(os.getenv("PREFETCH_CONCURRENCY", "4"))
+PREFETCH_LOAD_POLL = float(os.getenv("PREFETCH_LOAD_POLL", "0.1"))
+
+prefetches = Counter("splash_prefetch_total", "Speculative prefetches by outcome.")
+registry.append(prefetches)
+
+
+class Prefetcher:
+    """Runs speculative follow-up work in the background.
+
+    At most ``budget`` prefetches run at once, one per key; past that, or
+    while ``under_load()`` is true, new ones are skipped. Running prefetches
+    are cancelled as soon as ``under_load()`` turns true, so they never hold
+    upstream slots that real requests are queueing for.
+    """
+
+    def __init__(
+        self, under_load, budget=PREFETCH_CONCURRENCY, poll=PREFETCH_LOAD_POLL
+    ):
+        self.under_load = under_load
+        self.budget = budget
+        self.poll = poll
+        self._tasks = {}
+        self._watcher = None
+
+    def start(self, key, fn):
+        if key in self._tasks:
+            return
+        if len(self._tasks) >= self.budget or self.under_load():
+            prefetches.inc(outcome="skipped")
+            return
+        task = asyncio.create_task(self._run(fn))
+        self._tasks[key] = task
+        task.add_done_callback(lambda _: self._tasks.pop(key, None))
+        if self._watcher is None or self._watcher.done():
+            self._watcher = asyncio.create_task(self._watch())
+
+    async def close(self):
+        for task in [*self._tasks.values(), self._watcher]:
+            if task is not None:
+                task.cancel()
+        self._tasks.clear()
+
+    async def _run(self, fn):
+        current_route.set("prefetch")
+        # The task copied the triggering request's context; detach it from
+        # that request's trace so its spans and cache lookups stay out of it.
+        tracing.current_trace.set(None)
+        tracing.current_span.set(None)
+        try:
+            await fn()
+        except asyncio.CancelledError:
+            prefetches.inc(outcome="cancelled")
+            raise
+        except Exception as e:
+            prefetches.inc(outcome="failed")
+            print(f"Prefetch failed: {e}")
+        else:
+            prefetches.inc(outcome="done")
+
+    async def _watch(self):
+        while self._tasks:
+            await asyncio.sleep(self.poll)
+            if self.under_load():
+                for task in list(self._tasks.values()):
+                    task.cancel()
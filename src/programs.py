@@ -0,0 +1,317 @@
+import json
+import os
+
+import dsp
+import dspy
+from dspy.signatures.signature import signature_to_template
+
+# dspy signatures and modules used by the service. Importing dspy is the bulk
+# of app startup time, so app.py only imports this module during startup.
+
+# Post demos compiled offline by compile_demos.py. When the file is missing
+# the hand-written demos from build_demos are used.
+DEMOS_PATH = os.getenv(
+    "DEMOS_PATH",
+    os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "demos", "post_demos.json"
+    ),
+)
+
+
+class SocialMediaPostGenerator(dspy.Signature):
+    """You are a social media assistant who generates an engaging social media post with hashtags about the user's experience at the Databricks Data & AI World Tour 2024 (DAIWT) in Atlanta. This is a tech conference about Data and AI. Call out sessions where the local time overlaps with the user's post and assume that the user is one of the sessions if overlap happens between local time and session time. Each session is atleast 40 minutes. If there are multiple sessions that overlap, always choose AI sessions. If there are no AI sessions, choose based on current session.Give all posts a very positive spin to help it go viral. Ongoing sessions take priority, unless the user specifically calls out other sessions or topics"""
+
+    local_time = dspy.InputField()
+    user_post = dspy.InputField()
+    user_role = dspy.InputField(
+        desc="User's role in the conference. Either attendee or organizer or presenter"
+    )
+    agenda = dspy.InputField()
+    social_media_site = dspy.InputField()
+    rationale = dspy.OutputField(desc="Reasoning behind the post content and hashtags")
+    current_session = dspy.OutputField(
+        desc="Current session that the user could be in. If there isn't a match, return None"
+    )
+    post = dspy.OutputField(
+        desc="Engaging social media post with hashtags. Pay specific attention to any current session the user is in.This is the ongoing session."
+    )
+
+
+class EngagingSocialMediaPost(dspy.Module):
+    def __init__(self):
+        super().__init__()
+        self.generator = dspy.ChainOfThought(SocialMediaPostGenerator)
+
+    def forward(
+        self,
+        local_time,
+        user_post,
+        user_role,
+        agenda,
+        social_media_site,
+        config=None,
+        demos=None,
+    ):
+        return self.generator(
+            local_time=local_time,
+            user_post=user_post,
+            user_role=user_role,
+            agenda=agenda,
+            social_media_site=social_media_site,
+            config=config or {},
+            demos=self.generator.demos if demos is None else demos,
+        )
+
+
+def build_demos(agenda_index):
+    return [
+        dspy.Example(
+            local_time="09:30 AM EDT",
+            user_post="Excited for my presentation today!",
+            user_role="presenter",
+            agenda=agenda_index.prompt_fragment("09:30 AM EDT"),
+            social_media_site="LinkedIn",
+            rationale="The post should be professional and optimistic, highlighting the upcoming presentation. We'll use hashtags related to professional growth and presentations. The time suggests it's morning, so we can incorporate that.",
+            post="Good morning, LinkedIn! ☀️ Kicking off a productive day with a team meeting, followed by an exciting client presentation this afternoon. Ready to showcase our latest innovations! #ProfessionalGrowth #ClientPresentation #InnovationInAction",
+        ),
+        dspy.Example(
+            local_time="1:45 PM EDT",
+            user_post="Looking forward to my presentation!",
+            user_role="presenter",
+            agenda=agenda_index.prompt_fragment("1:45 PM EDT"),
+            social_media_site="LinkedIn",
+            rationale="The post should be professional yet engaging, suitable for Instagram. We'll focus on the upcoming presentation, incorporating the user's role as a presenter. The time suggests it's just before the presentation, so we'll emphasize preparation and excitement. We'll use relevant hashtags to increase visibility and engagement.",
+            post="Pre-presentation butterflies! 🦋 Just 15 minutes until I take the stage to share our latest innovations with our valued clients. Months of hard work have led to this moment. Excited to showcase what our amazing team has accomplished! 💼✨ #ProfessionalGrowth #PublicSpeaking #InnovationPresentation #ReadyToInspire",
+        ),
+    ]
+
+
+class MultiPlatformPostGenerator(dspy.Signature):
+    """You are a social media assistant who generates engaging social media posts with hashtags about the user's experience at the Databricks Data & AI World Tour 2024 (DAIWT) in Atlanta. This is a tech conference about Data and AI. Call out sessions where the local time overlaps with the user's post and assume that the user is one of the sessions if overlap happens between local time and session time. Each session is atleast 40 minutes. If there are multiple sessions that overlap, always choose AI sessions. If there are no AI sessions, choose based on current session.Give all posts a very positive spin to help it go viral. Ongoing sessions take priority, unless the user specifically calls out other sessions or topics. Write one post for every site in social_media_sites, each adapted to that site's tone, length and hashtag conventions."""
+
+    local_time = dspy.InputField()
+    user_post = dspy.InputField()
+    user_role = dspy.InputField(
+        desc="User's role in the conference. Either attendee or organizer or presenter"
+    )
+    agenda = dspy.InputField()
+    social_media_sites = dspy.InputField(
+        desc="Comma-separated social media sites to write a post for"
+    )
+    rationale = dspy.OutputField(desc="Reasoning behind the posts and hashtags")
+    current_session = dspy.OutputField(
+        desc="Current session that the user could be in. If there isn't a match, return None"
+    )
+    posts = dspy.OutputField(
+        desc='JSON list with one {"social_media_site": ..., "post": ...} object per site, in the order given. Each post is an engaging social media post with hashtags about the ongoing session.'
+    )
+
+
+class MultiPlatformPost(dspy.Module):
+    """One completion that returns a post for each of ``social_media_sites``.
+
+    The prediction's ``posts`` is the raw completion text; parse_post_variants
+    turns it into ``{"social_media_site", "post"}`` dicts in the requested
+    order. Parsing is left to the caller so that a badly formatted completion
+    is not mistaken for a failing endpoint.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.generator = dspy.ChainOfThought(MultiPlatformPostGenerator)
+
+    def forward(
+        self,
+        local_time,
+        user_post,
+        user_role,
+        agenda,
+        social_media_sites,
+        config=None,
+    ):
+        result = self.generator(
+            local_time=local_time,
+            user_post=user_post,
+            user_role=user_role,
+            agenda=agenda,
+            social_media_sites=", ".join(social_media_sites),
+            config=config or {},
+        )
+        return dspy.Prediction(
+            rationale=result.rationale,
+            current_session=result.current_session,
+            posts=result.posts,
+        )
+
+
+def parse_post_variants(text, social_media_sites):
+    variants = json.loads(text[text.find("[") : text.rfind("]") + 1])
+    by_site = {
+        str(variant.get("social_media_site", "")).strip().lower(): variant.get("post")
+        for variant in variants
+        if isinstance(variant, dict)
+    }
+    posts = []
+    for site in social_media_sites:
+        post = by_site.get(site.strip().lower())
+        if not post:
+            raise ValueError(f"The completion has no post for {site!r}")
+        posts.append({"social_media_site": site, "post": post.strip()})
+    return posts
+
+
+def session_agenda(agenda_index, local_time, current_session):
+    """Agenda reduced to the session a demo post is labeled with.
+
+    A post about no session ("None") gets an empty agenda. If the labeled
+    session is not on at ``local_time``, the demo keeps the full agenda
+    fragment the live prompt would carry.
+    """
+    if current_session in (None, "None"):
+        return agenda_index.empty_fragment
+    title = current_session.strip().lower()
+    for session in agenda_index.sessions_at(local_time):
+        if session["title"].strip().lower() == title:
+            return json.dumps({"sessions": [session]})
+    return agenda_index.prompt_fragment(local_time)
+
+
+def load_compiled_demos(path=DEMOS_PATH):
+    """Demos from a compile_demos.py artifact, or None if there is none."""
+    if not os.path.exists(path):
+        return None
+    with open(path) as file:
+        artifact = json.load(file)
+    if artifact.get("signature") != SocialMediaPostGenerator.__name__:
+        raise ValueError(
+            f"{path} holds demos for {artifact.get('signature')!r}, "
+            f"not {SocialMediaPostGenerator.__name__!r}"
+        )
+    missing = [
+        (i, name)
+        for i, demo in enumerate(artifact["demos"])
+        for name in SocialMediaPostGenerator.fields
+        if name not in demo and name != "rationale"
+    ]
+    if missing:
+        raise ValueError(f"{path} demos are missing fields: {missing}")
+    print(f"Loaded {len(artifact['demos'])} compiled demos v{artifact['version']}")
+    return [dspy.Example(**demo) for demo in artifact["demos"]]
+
+
+class ImgGenSignature(dspy.Signature):
+    user_post = dspy.InputField(desc="the social media post the user wants to make")
+    negative_prompt = dspy.InputField(
+        desc="include this statement to the prompt to avoid generating incorrect images"
+    )
+    extracted_topics = dspy.OutputField(
+        desc="the extracted topics from the user's post relevant to Data and AI. must be specific to databricks. include mosaic ai if user is interested in AI"
+    )
+    flux_prompt = dspy.OutputField(
+        desc="the prompt to be used for generating the image worthy of sharing in social media using flux1 image generation models.Focus on the ambience."
+    )
+
+
+class SocialMediaProcessor(dspy.Module):
+    def __init__(self):
+        super().__init__()
+        self.prompt_generator = dspy.ChainOfThought(ImgGenSignature)
+
+    def forward(self, user_post, negative_prompt, config=None):
+        result = self.prompt_generator(
+            user_post=user_post, negative_prompt=negative_prompt, config=config or {}
+        )
+        return result
+
+
+class FusedPostSignature(dspy.Signature):
+    """You are a social media assistant who generates an engaging social media post with hashtags about the user's experience at the Databricks Data & AI World Tour 2024 (DAIWT) in Atlanta. This is a tech conference about Data and AI. Call out sessions where the local time overlaps with the user's post and assume that the user is one of the sessions if overlap happens between local time and session time. Each session is atleast 40 minutes. If there are multiple sessions that overlap, always choose AI sessions. If there are no AI sessions, choose based on current session.Give all posts a very positive spin to help it go viral. Ongoing sessions take priority, unless the user specifically calls out other sessions or topics. Then extract the Databricks topics from the user's post and write a prompt for an image to share alongside the post."""
+
+    local_time = dspy.InputField()
+    user_post = dspy.InputField()
+    user_role = dspy.InputField(
+        desc="User's role in the conference. Either attendee or organizer or presenter"
+    )
+    agenda = dspy.InputField()
+    social_media_site = dspy.InputField()
+    negative_prompt = dspy.InputField(
+        desc="include this statement to the prompt to avoid generating incorrect images"
+    )
+    rationale = dspy.OutputField(desc="Reasoning behind the post content and hashtags")
+    current_session = dspy.OutputField(
+        desc="Current session that the user could be in. If there isn't a match, return None"
+    )
+    post = dspy.OutputField(
+        desc="Engaging social media post with hashtags. Pay specific attention to any current session the user is in.This is the ongoing session."
+    )
+    extracted_topics = dspy.OutputField(
+        desc="the extracted topics from the user's post relevant to Data and AI. must be specific to databricks. include mosaic ai if user is interested in AI"
+    )
+    flux_prompt = dspy.OutputField(
+        desc="the prompt to be used for generating the image worthy of sharing in social media using flux1 image generation models.Focus on the ambience."
+    )
+
+
+# Image fields added to the post demos for the fused signature, by position.
+FUSED_DEMO_FIELDS = [
+    {
+        "extracted_topics": "Databricks Data Intelligence Platform, Mosaic AI",
+        "flux_prompt": "A bright modern conference stage in Atlanta in warm morning light, a presenter setting up beside a large screen while the audience settles in, optimistic and professional ambience",
+    },
+    {
+        "extracted_topics": "Databricks Data Intelligence Platform",
+        "flux_prompt": "Backstage at a tech conference moments before a talk, soft spotlight spilling through the curtain, a laptop glowing with slides, anticipation and energy in the air",
+    },
+]
+
+
+class FusedSocialMediaPost(dspy.Module):
+    """Post, current session, topics and flux prompt from a single completion.
+
+    Replaces an EngagingSocialMediaPost call followed by a SocialMediaProcessor
+    call over the same user_post.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.generator = dspy.ChainOfThought(FusedPostSignature)
+
+    def forward(
+        self,
+        local_time,
+        user_post,
+        user_role,
+        agenda,
+        social_media_site,
+        negative_prompt,
+        config=None,
+        demos=None,
+    ):
+        return self.generator(
+            local_time=local_time,
+            user_post=user_post,
+            user_role=user_role,
+            agenda=agenda,
+            social_media_site=social_media_site,
+            negative_prompt=negative_prompt,
+            config=config or {},
+            demos=self.generator.demos if demos is None else demos,
+        )
+
+
+def fuse_demos(demos, negative_prompt):
+    """Extend post demos with the image fields the fused signature outputs.
+
+    Demos without an entry in FUSED_DEMO_FIELDS are dropped, since dspy skips
+    demos that are missing the last output field anyway.
+    """
+    return [
+        demo.copy(negative_prompt=negative_prompt, **fields)
+        for demo, fields in zip(demos, FUSED_DEMO_FIELDS)
+    ]
+
+
+def render_prompt(predictor, demos, **inputs):
+    """The prompt ``predictor`` would send for ``inputs``, without calling the LM."""
+    template = signature_to_template(predictor.extended_signature)
+    return template(dsp.Example(demos=demos, **inputs))
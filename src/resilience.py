@@ -0,0 +1,199 @@
+import asyncio
+import functools
+import json
+import os
+import time
+
+from admission import Overloaded
+from metrics import Counter, current_route, registry
+
+LM_DEADLINE = float(os.getenv("LM_DEADLINE", "30"))
+# Per-route overrides, e.g. {"/generate-social-media-post": 15}
+LM_ROUTE_DEADLINES = json.loads(os.getenv("LM_ROUTE_DEADLINES", "{}"))
+# Seconds to wait on the primary before sending a duplicate to the fallback.
+# Unset disables hedging.
+LM_HEDGE_DELAY = os.getenv("LM_HEDGE_DELAY")
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+
+hedges = Counter("splash_lm_hedges_total", "Hedged LM calls and which model won.")
+fallbacks = Counter("splash_lm_fallbacks_total", "LM calls routed to the fallback.")
+registry.extend([hedges, fallbacks])
+
+
+class DeadlineExceeded(Exception):
+    def __init__(self, seconds):
+        super().__init__(f"Upstream call did not finish within {seconds}s")
+        self.seconds = seconds
+
+
+def route_deadline():
+    return float(LM_ROUTE_DEADLINES.get(current_route.get(), LM_DEADLINE))
+
+
+class CircuitBreaker:
+    """Opens after ``failures`` consecutive failures and stays open for
+    ``reset_seconds``; then lets one trial call through (half-open)."""
+
+    def __init__(self, failures=BREAKER_FAILURES, reset_seconds=BREAKER_RESET_SECONDS):
+        self.failures = failures
+        self.reset_seconds = reset_seconds
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self.trial_in_flight:
+            self.trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        self.trial_in_flight = False
+        if self.opened_at is not None or self.consecutive_failures >= self.failures:
+            self.opened_at = time.monotonic()
+
+
+class FailoverRouter:
+    """Routes calls to a primary model with a deadline, optional hedging to a
+    fallback model, and a circuit breaker that fails over while the primary
+    is unhealthy.
+
+    ``attempt`` is an async callable taking the model name to call. With a
+    ``limiter``, each attempt (hedges included) first takes one of its slots
+    and keeps it until the attempt itself completes, even after the caller
+    gave up on it: a call running in an executor thread cannot be cancelled
+    and keeps the upstream busy until it returns. Only errors from the
+    primary and the deadline expiring while it runs count against the
+    breaker; waiting for a slot or being shed (Overloaded) does not.
+    """
+
+    def __init__(self, primary, fallback=None, hedge_delay=LM_HEDGE_DELAY):
+        self.primary = primary
+        self.fallback = fallback if fallback and fallback != primary else None
+        self.hedge_delay = float(hedge_delay) if hedge_delay else None
+        self.breaker = CircuitBreaker()
+
+    def pick(self):
+        if self.fallback is None or self.breaker.allow():
+            return self.primary
+        fallbacks.inc(model=self.fallback)
+        return self.fallback
+
+    async def call(self, attempt, deadline=None, limiter=None):
+        deadline = route_deadline() if deadline is None else deadline
+        try:
+            return await asyncio.wait_for(self._call(attempt, limiter), deadline)
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded(deadline) from None
+
+    async def _call(self, attempt, limiter):
+        if limiter is not None:
+            await limiter.acquire()
+        # Pick only once admitted, so a shed call cannot take the half-open
+        # trial with it.
+        model = self.pick()
+        if model != self.primary:
+            return await self._start(attempt, model, limiter)
+
+        primary = asyncio.create_task(
+            self._tracked(self._start(attempt, model, limiter))
+        )
+        pending = {primary}
+        hedged = False
+        try:
+            if self.hedge_delay is not None and self.fallback is not None:
+                done, _ = await asyncio.wait(pending, timeout=self.hedge_delay)
+                if not done:
+                    pending.add(asyncio.create_task(self._hedge(attempt, limiter)))
+                    hedged = True
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        if hedged:
+                            winner = self.primary if task is primary else self.fallback
+                            hedges.inc(winner=winner)
+                        return task.result()
+                    error = task.exception()
+            raise error
+        except asyncio.CancelledError:
+            if not primary.done():
+                # The deadline expired with the primary still running.
+                self.breaker.record_failure()
+            raise
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _hedge(self, attempt, limiter):
+        if limiter is not None:
+            await limiter.acquire()
+        return await self._start(attempt, self.fallback, limiter)
+
+    def _start(self, attempt, model, limiter):
+        """Start ``attempt(model)`` on a slot already taken from ``limiter``.
+
+        The slot is released when the attempt completes; callers wait on a
+        shield so that cancelling them does not cancel the attempt.
+        """
+        try:
+            future = asyncio.ensure_future(attempt(model))
+        except BaseException:
+            if limiter is not None:
+                limiter.release()
+            raise
+        if limiter is None:
+            return future
+        future.add_done_callback(functools.partial(self._release, limiter))
+        return asyncio.shield(future)
+
+    @staticmethod
+    def _release(limiter, future):
+        limiter.release()
+        if not future.cancelled():
+            # Nobody may be waiting for it any more; retrieve the error here.
+            future.exception()
+
+    async def _tracked(self, future):
+        try:
+            result = await future
+        except (asyncio.CancelledError, Overloaded):
+            # Lost a hedge race, hit the deadline (which _call records) or was
+            # shed before reaching the model.
+            self.breaker.trial_in_flight = False
+            raise
+        except Exception:
+            self.record(self.primary, ok=False)
+            raise
+        self.record(self.primary, ok=True)
+        return result
+
+    def record(self, model, ok):
+        """Feed the outcome of a call made outside ``call`` to the breaker."""
+        if model != self.primary:
+            return
+        if ok:
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
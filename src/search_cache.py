@@ -0,0 +1,60 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from tracing import record_cache
+
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "1024"))
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "900"))
+
+
+def normalize_topics(topics):
+    """Lowercased, deduplicated, sorted topic tuple used as the cache key."""
+    return tuple(
+        sorted({topic.strip().lower() for topic in topics.split(",") if topic.strip()})
+    )
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire ``ttl`` seconds after insert."""
+
+    def __init__(self, maxsize=SEARCH_CACHE_SIZE, ttl=SEARCH_CACHE_TTL, name="search"):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                record_cache(self.name, hit=True)
+                return entry[1]
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            record_cache(self.name, hit=False)
+            return None
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    async def aget(self, key):
+        return self.get(key)
+
+    async def aset(self, key, value):
+        self.set(key, value)
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._data)}
@@ -0,0 +1,141 @@
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from search_cache import SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL, TTLCache
+from tracing import record_cache
+from upstream import run_upstream
+
+WORKERS = int(os.getenv("WORKERS", "1"))
+# "memory" keeps a TTLCache per process; "sqlite" shares one file between all
+# workers on the host. Defaults to sqlite as soon as there is more than one.
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "sqlite" if WORKERS > 1 else "memory")
+CACHE_PATH = os.getenv(
+    "CACHE_PATH", os.path.join(tempfile.gettempdir(), "splash-cache.sqlite3")
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    expires REAL NOT NULL,
+    accessed REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE INDEX IF NOT EXISTS cache_accessed ON cache (namespace, accessed);
+"""
+
+
+class SqliteCache:
+    """TTL + LRU cache in a SQLite file (WAL mode) shared by every process on
+    the host. Same interface as TTLCache; keys and values must be JSON-able.
+
+    Each namespace is capped at ``maxsize`` entries, evicting the least
+    recently read first. Expiry uses wall-clock time since it has to agree
+    across processes. Hit/miss counters are per process. Handlers use
+    ``aget``/``aset``, which run the queries in the upstream executor since a
+    write can wait up to 5s for another process's lock.
+    """
+
+    def __init__(
+        self,
+        namespace,
+        path=CACHE_PATH,
+        maxsize=SEARCH_CACHE_SIZE,
+        ttl=SEARCH_CACHE_TTL,
+    ):
+        self.namespace = namespace
+        self.path = path
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connect().executescript(SCHEMA)
+
+    def _connect(self):
+        # sqlite3 connections are not shared between threads.
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, hit):
+        record_cache(self.namespace, hit)
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key):
+        key = json.dumps(key)
+        now = time.time()
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT value, expires FROM cache WHERE namespace = ? AND key = ?",
+            (self.namespace, key),
+        ).fetchone()
+        if row is None or row[1] <= now:
+            if row is not None:
+                conn.execute(
+                    "DELETE FROM cache WHERE namespace = ? AND key = ?",
+                    (self.namespace, key),
+                )
+            self._count(hit=False)
+            return None
+        conn.execute(
+            "UPDATE cache SET accessed = ? WHERE namespace = ? AND key = ?",
+            (now, self.namespace, key),
+        )
+        self._count(hit=True)
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        now = time.time()
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?)",
+            (self.namespace, json.dumps(key), json.dumps(value), now + self.ttl, now),
+        )
+        conn.execute(
+            "DELETE FROM cache WHERE namespace = ? AND expires <= ?",
+            (self.namespace, now),
+        )
+        conn.execute(
+            "DELETE FROM cache WHERE namespace = ? AND key IN ("
+            " SELECT key FROM cache WHERE namespace = ?"
+            " ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+            (self.namespace, self.namespace, self.maxsize),
+        )
+
+    async def aget(self, key):
+        return await run_upstream(self.get, key)
+
+    async def aset(self, key, value):
+        await run_upstream(self.set, key, value)
+
+    def stats(self):
+        (size,) = (
+            self._connect()
+            .execute(
+                "SELECT COUNT(*) FROM cache WHERE namespace = ?", (self.namespace,)
+            )
+            .fetchone()
+        )
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": size}
+
+
+def make_cache(namespace, maxsize=SEARCH_CACHE_SIZE, ttl=SEARCH_CACHE_TTL):
+    if CACHE_BACKEND == "sqlite":
+        return SqliteCache(namespace, maxsize=maxsize, ttl=ttl)
+    return TTLCache(maxsize=maxsize, ttl=ttl, name=namespace)
@@ -0,0 +1,57 @@
+import asyncio
+
+from metrics import Counter, registry
+
+coalesced = Counter(
+    "splash_coalesced_total", "Calls that joined an identical call already in flight."
+)
+registry.append(coalesced)
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time.
+
+    The first caller for a key starts ``fn()``; callers that arrive while it
+    is running await the same task instead of starting their own. The task is
+    shielded, so a caller that goes away does not cancel it for the others;
+    it is only cancelled once every caller waiting on it has been cancelled.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._inflight = {}
+        self._waiters = {}
+
+    async def do(self, key, fn):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            self._waiters[task] = 0
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            coalesced.inc(call=self.name)
+        self._waiters[task] += 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self._waiters.get(task) == 1 and not task.done():
+                # Last caller gone: stop the work and let the next caller
+                # start afresh rather than join a task being cancelled.
+                self._forget(key, task)
+                task.cancel()
+            raise
+        finally:
+            if task in self._waiters:
+                self._waiters[task] -= 1
+
+    def _forget(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+    def _finish(self, key, task):
+        self._forget(key, task)
+        self._waiters.pop(task, None)
+        if not task.cancelled():
+            # Mark the exception as retrieved in case every caller went away.
+            task.exception()
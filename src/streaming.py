@@ -0,0 +1,58 @@
+import json
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def stream_field_line(deltas, prefix):
+    """Yield the first line of the ``prefix`` field as text deltas arrive.
+
+    dspy templates render each output field as "Prefix: value" separated by
+    blank lines. Everything before ``prefix`` at the start of a line is
+    skipped, as in dsp's Template.extract, so a mention of the prefix inside
+    an earlier field does not start the stream. The generator returns as
+    soon as the field's first line is complete, which is all the post
+    endpoint ever keeps.
+    """
+    marker = "\n" + prefix
+    buffer = ""
+    started = False
+    emitted = ""
+    async for delta in deltas:
+        buffer += delta
+        if not started:
+            idx = buffer.find(marker)
+            if idx < 0:
+                continue
+            started = True
+            buffer = buffer[idx + len(marker) :]
+        if not emitted:
+            buffer = buffer.lstrip()
+            if not buffer:
+                continue
+        newline = buffer.find("\n")
+        text = buffer if newline < 0 else buffer[:newline]
+        if text:
+            emitted += text
+            yield text
+        if newline >= 0:
+            return
+        buffer = ""
+
+
+async def chat_deltas(stream, usage=None):
+    """Yield the text deltas of a chat completion stream.
+
+    If ``usage`` is a dict it counts content chunks as completion tokens while
+    they arrive, and takes the endpoint's own counts from the final chunk sent
+    with ``stream_options={"include_usage": True}`` if the stream gets there.
+    """
+    async for chunk in stream:
+        if usage is not None and chunk.usage is not None:
+            usage.clear()
+            usage.update(chunk.usage.model_dump())
+        if chunk.choices and chunk.choices[0].delta.content:
+            if usage is not None:
+                usage["completion_tokens"] = usage.get("completion_tokens", 0) + 1
+            yield chunk.choices[0].delta.content
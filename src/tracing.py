@@ -0,0 +1,172 @@
+import contextvars
+import cProfile
+import json
+import logging
+import os
+import queue
+import random
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# One JSON line per request with a span per tracked stage. Off by default.
+TRACING = os.getenv("TRACING", "false").lower() in ("1", "true", "yes")
+TRACE_PATH = os.getenv(
+    "TRACE_PATH", os.path.join(tempfile.gettempdir(), "splash-traces.jsonl")
+)
+TRACE_MAX_BYTES = int(os.getenv("TRACE_MAX_BYTES", str(50 * 1024**2)))
+TRACE_BACKUPS = int(os.getenv("TRACE_BACKUPS", "5"))
+# Fraction of traced requests that also get a cProfile dump in TRACE_PROFILE_DIR
+TRACE_PROFILE_RATE = float(os.getenv("TRACE_PROFILE_RATE", "0"))
+TRACE_PROFILE_DIR = os.getenv(
+    "TRACE_PROFILE_DIR", os.path.join(tempfile.gettempdir(), "splash-profiles")
+)
+
+current_trace = contextvars.ContextVar("current_trace", default=None)
+current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Trace:
+    def __init__(self, route):
+        self.id = uuid.uuid4().hex
+        self.route = route
+        self.started = time.perf_counter()
+        self.timestamp = time.time()
+        self.spans = []
+        self.cache = []
+        self.profile = None
+
+    def offset_ms(self):
+        return round((time.perf_counter() - self.started) * 1000, 3)
+
+    def to_dict(self, status):
+        entry = {
+            "trace_id": self.id,
+            "timestamp": self.timestamp,
+            "route": self.route,
+            "status": status,
+            "duration_ms": self.offset_ms(),
+            "spans": self.spans,
+            "cache": self.cache,
+        }
+        if self.profile is not None:
+            entry["profile"] = self.profile
+        return entry
+
+
+class TraceWriter:
+    """Appends traces to a size-rotated JSONL file.
+
+    ``write`` only queues the line; a listener thread, running between
+    ``start`` and ``stop``, does the file I/O and rotation so neither blocks
+    the event loop.
+
+    With several worker processes each one writes its own file, suffixed with
+    its pid, since rotation is not safe across processes.
+    """
+
+    def __init__(
+        self, path=TRACE_PATH, max_bytes=TRACE_MAX_BYTES, backups=TRACE_BACKUPS
+    ):
+        if int(os.getenv("WORKERS", "1")) > 1:
+            root, ext = os.path.splitext(path)
+            path = f"{root}.{os.getpid()}{ext}"
+        self.path = path
+        self.logger = logging.getLogger(f"splash.traces.{path}")
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+        handler = RotatingFileHandler(
+            path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8"
+        )
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        lines = queue.SimpleQueue()
+        self.listener = QueueListener(lines, handler)
+        for old in list(self.logger.handlers):
+            self.logger.removeHandler(old)
+        self.logger.addHandler(QueueHandler(lines))
+
+    def start(self):
+        self.listener.start()
+
+    def stop(self):
+        # Writes out whatever is still queued before returning.
+        self.listener.stop()
+        for handler in self.listener.handlers:
+            handler.close()
+
+    def write(self, trace, status):
+        self.logger.info(json.dumps(trace.to_dict(status), default=str))
+
+
+class RequestProfiler:
+    """Samples requests for a cProfile dump, one request at a time.
+
+    The profile covers the event loop thread while the request is running,
+    so it can include other requests' coroutines interleaved with it; work
+    done in upstream executor threads is not in it.
+    """
+
+    def __init__(self, rate=TRACE_PROFILE_RATE, directory=TRACE_PROFILE_DIR):
+        self.rate = rate
+        self.directory = directory
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def maybe_profile(self, trace):
+        if random.random() >= self.rate or not self._lock.acquire(blocking=False):
+            yield
+            return
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+            try:
+                yield
+            finally:
+                profile.disable()
+            os.makedirs(self.directory, exist_ok=True)
+            trace.profile = os.path.join(self.directory, f"{trace.id}.prof")
+            profile.dump_stats(trace.profile)
+        finally:
+            self._lock.release()
+
+
+@contextmanager
+def span(stage):
+    """Record ``stage`` as a span of the current trace, if there is one.
+
+    Yields the span dict (or None) so callers can add attributes; code deeper
+    down can use ``annotate`` instead.
+    """
+    trace = current_trace.get()
+    if trace is None:
+        yield None
+        return
+    entry = {"stage": stage, "start_ms": trace.offset_ms()}
+    token = current_span.set(entry)
+    start = time.perf_counter()
+    try:
+        yield entry
+    except BaseException as e:
+        entry["error"] = type(e).__name__
+        raise
+    finally:
+        entry["duration_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        current_span.reset(token)
+        # Spans from executor threads land here too; list.append is atomic.
+        trace.spans.append(entry)
+
+
+def annotate(**attrs):
+    """Add attributes to the innermost open span."""
+    entry = current_span.get()
+    if entry is not None:
+        entry.update(attrs)
+
+
+def record_cache(cache, hit):
+    trace = current_trace.get()
+    if trace is not None:
+        trace.cache.append({"cache": cache, "hit": hit, "at_ms": trace.offset_ms()})
@@ -0,0 +1,114 @@
+import gradio as gr
+
+# The Gradio UI, served from the FastAPI process by app.py so that it shares
+# the API's pipeline, connection pools and caches.
+
+
+def info_fn():
+    gr.Info("Whipping up some AI 🤖 magic!!")
+
+
+def build_demo(run_pipeline, resolve_image=None):
+    """Build the post maker UI on top of the async ``run_pipeline`` callable.
+
+    ``run_pipeline`` takes the /generate-all request fields as keyword
+    arguments and returns a GenerateAllResponse. ``resolve_image`` maps an
+    image URL served by the API to a local file, or returns None.
+    """
+
+    async def update(
+        text,
+        user_type,
+        social_media,
+        generate_image,
+        generate_recommendations,
+        progress=gr.Progress(),
+    ):
+        result = await run_pipeline(
+            user_post=text or "",
+            user_role=user_type or "",
+            social_media_site=social_media or "",
+            generate_image=bool(generate_image),
+            generate_recommendations=bool(generate_recommendations),
+        )
+
+        image = None
+        if result.image_url:
+            image = (
+                result.image_url
+                if isinstance(result.image_url, str)
+                else result.image_url[0]
+            )
+            if resolve_image is not None:
+                image = resolve_image(image) or image
+
+        recommendations = None
+        if result.links:
+            recommendations = "\n".join(
+                [f"{i+1}. [{link}]({link})" for i, link in enumerate(result.links)]
+            )
+
+        return result.post, image, recommendations
+
+    with gr.Blocks(
+        theme=gr.themes.Soft(primary_hue="orange", font="DM Sans"),
+        css="footer {visibility: hidden}",
+        title="Post Maker",
+    ) as demo:
+        gr.Markdown("Generate a social media post & go viral! 🚀🚀")
+        with gr.Row():
+            inp = gr.Textbox(
+                label="Social Post Generator",
+                placeholder="What do you want to generate a post about?",
+                lines=4,
+            )
+
+            with gr.Column():
+                user_type = gr.Radio(
+                    ["Speaker", "Attendee", "Organizer"],
+                    label="I am a...",
+                    info="In what capacity are you attending the conference?",
+                )
+                social_media = gr.Dropdown(
+                    ["LinkedIn", "Facebook", "Instagram"],
+                    label="Social Media App",
+                    info="Which app do you want to post to?",
+                )
+
+        with gr.Row():
+            generate_image = gr.Checkbox(
+                label="Generate Image", info="Do you want to also generate an Image?"
+            )
+            generate_recommendations = gr.Checkbox(
+                label="Generate More Recommendations",
+                info="Fetch More Content to Read About?",
+            )
+        with gr.Column():
+            with gr.Row():
+                out = gr.Textbox(label="Generated Post", visible=False, lines=5)
+                out_img = gr.Image(
+                    label="Generated Image", visible=False, height="400px"
+                )
+        out_rec = gr.Markdown(label="Recommendations", visible=False)
+
+        btn = gr.Button("Run")
+        btn.click(info_fn, None, None).then(
+            fn=update,
+            inputs=[
+                inp,
+                user_type,
+                social_media,
+                generate_image,
+                generate_recommendations,
+            ],
+            outputs=[out, out_img, out_rec],
+        ).then(
+            lambda: (
+                gr.update(visible=True),
+                gr.update(visible=True),
+                gr.update(visible=True),
+            ),
+            outputs=[out, out_img, out_rec],
+        )
+
+    return demo
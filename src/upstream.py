@@ -0,0 +1,39 @@
+import asyncio
+import contextvars
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# dspy, replicate, the OpenAI client and DuckDuckGo search are all blocking.
+# Handlers hand them to this bounded pool so the event loop stays free while
+# an upstream round trip is in flight.
+UPSTREAM_POOL_SIZE = int(os.getenv("UPSTREAM_POOL_SIZE", "64"))
+
+upstream_executor = None
+
+
+def get_upstream_executor():
+    """The pool, created on first use and again after a shutdown, so the app
+    can be started more than once in one process (e.g. in tests)."""
+    global upstream_executor
+    if upstream_executor is None:
+        upstream_executor = ThreadPoolExecutor(
+            max_workers=UPSTREAM_POOL_SIZE, thread_name_prefix="upstream"
+        )
+    return upstream_executor
+
+
+def shutdown_upstream_executor():
+    global upstream_executor
+    executor, upstream_executor = upstream_executor, None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def run_upstream(fn, *args, **kwargs):
+    # Like asyncio.to_thread, carry the caller's contextvars into the worker.
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(
+        get_upstream_executor(), functools.partial(ctx.run, fn, *args, **kwargs)
+    )
@@ -0,0 +1,138 @@
+import json
+import os
+import time
+
+import pytest
+
+from agenda_index import AgendaIndex, AgendaStore, parse_clock
+
+AGENDA = {
+    "sessions": [
+        {"time": "9:00 AM EDT", "sessionType": "Keynote", "title": "Keynote"},
+        {
+            "time": "10:00 AM EDT",
+            "sessionType": "Breakout",
+            "title": "Lakehouse Storage",
+            "description": "Delta tables in depth.",
+        },
+        {
+            "time": "10:00 AM EDT",
+            "sessionType": "Breakout",
+            "title": "Building RAG Apps",
+            "description": "Retrieval for LLMs.",
+        },
+        {"time": "01:30 PM EDT", "sessionType": "Lunch", "title": "Lunch"},
+    ]
+}
+
+
+def titles(fragment):
+    return [session["title"] for session in json.loads(fragment)["sessions"]]
+
+
+def test_parse_clock():
+    assert parse_clock("9:00 AM EDT") == 9 * 60
+    assert parse_clock("12:15 PM EDT") == 12 * 60 + 15
+    assert parse_clock("12:05 AM") == 5
+    assert parse_clock("01:45 pm EDT") == 13 * 60 + 45
+
+
+def test_session_runs_until_next_start_or_min_duration():
+    index = AgendaIndex(AGENDA, lookahead_minutes=15)
+    # Each session runs until the next start time, and at least 40 minutes.
+    assert index.ends == [10 * 60, 13 * 60 + 30, 13 * 60 + 30, 14 * 60 + 10]
+
+
+def test_fragment_before_and_after_the_agenda_is_empty():
+    index = AgendaIndex(AGENDA, lookahead_minutes=15)
+    assert titles(index.prompt_fragment("7:00 AM EDT")) == []
+    assert titles(index.prompt_fragment("11:00 PM EDT")) == []
+
+
+def test_fragment_boundaries():
+    index = AgendaIndex(AGENDA, lookahead_minutes=15)
+    assert titles(index.prompt_fragment("8:44 AM EDT")) == []
+    assert titles(index.prompt_fragment("8:45 AM EDT")) == ["Keynote"]
+    assert titles(index.prompt_fragment("9:44 AM EDT")) == ["Keynote"]
+    # Sessions starting within the lookahead show up next to the running one.
+    assert set(titles(index.prompt_fragment("9:45 AM EDT"))) == {
+        "Keynote",
+        "Lakehouse Storage",
+        "Building RAG Apps",
+    }
+    # A session ending at 10:00 is no longer in progress at 10:00.
+    assert "Keynote" not in titles(index.prompt_fragment("10:00 AM EDT"))
+    assert titles(index.prompt_fragment("1:15 PM EDT")) == [
+        "Building RAG Apps",
+        "Lakehouse Storage",
+        "Lunch",
+    ]
+    assert titles(index.prompt_fragment("1:30 PM EDT")) == ["Lunch"]
+    assert titles(index.prompt_fragment("2:10 PM EDT")) == []
+
+
+def test_ranking_puts_ai_then_in_progress_first():
+    index = AgendaIndex(AGENDA, lookahead_minutes=15)
+    assert titles(index.prompt_fragment("10:10 AM EDT")) == [
+        "Building RAG Apps",
+        "Lakehouse Storage",
+    ]
+    sessions = index.sessions_at("9:50 AM EDT")
+    assert [session["title"] for session in sessions] == [
+        "Building RAG Apps",
+        "Keynote",
+        "Lakehouse Storage",
+    ]
+    assert [session["status"] for session in sessions] == [
+        "starting soon",
+        "in progress",
+        "starting soon",
+    ]
+
+
+def test_fragment_matches_sessions_at_every_minute():
+    index = AgendaIndex(AGENDA, lookahead_minutes=15)
+    for minute in range(7 * 60, 15 * 60):
+        clock = f"{(minute // 60 - 1) % 12 + 1}:{minute % 60:02d} {'PM' if minute >= 720 else 'AM'}"
+        assert json.loads(index.prompt_fragment(clock)) == {
+            "sessions": index.sessions_at(clock)
+        }, clock
+
+
+def test_empty_agenda():
+    index = AgendaIndex({})
+    assert titles(index.prompt_fragment("10:00 AM EDT")) == []
+    assert index.sessions_at("10:00 AM EDT") == []
+
+
+def write_agenda(path, agenda, mtime):
+    path.write_text(json.dumps(agenda))
+    os.utime(path, (mtime, mtime))
+
+
+@pytest.mark.parametrize(
+    "bad",
+    [
+        {"sessions": [{"time": None, "title": "Broken"}]},
+        [{"time": "9:00 AM EDT", "title": "Not wrapped"}],
+        {"sessions": [{"title": "No time"}]},
+    ],
+)
+def test_store_keeps_last_good_agenda_and_recovers(tmp_path, bad):
+    path = tmp_path / "agenda.json"
+    write_agenda(path, AGENDA, 1000)
+    store = AgendaStore(path=str(path), poll_seconds=0.01)
+    store.start()
+    try:
+        write_agenda(path, bad, 2000)
+        time.sleep(0.1)
+        assert len(store.snapshot.index.sessions) == 4
+        fixed = {"sessions": AGENDA["sessions"][:1]}
+        write_agenda(path, fixed, 3000)
+        for _ in range(100):
+            if len(store.snapshot.index.sessions) == 1:
+                break
+            time.sleep(0.01)
+        assert len(store.snapshot.index.sessions) == 1
+    finally:
+        store.stop()
@@ -0,0 +1,64 @@
+import asyncio
+import functools
+import time
+
+import admission
+from batching import MicroBatcher, dispatch_burst
+from metrics import current_route
+
+
+def test_batched_calls_run_in_their_submitters_context():
+    batcher = MicroBatcher(max_size=16, max_wait=0.01)
+
+    def call():
+        return current_route.get()
+
+    async def submit(route):
+        current_route.set(route)
+        return await batcher.submit(call)
+
+    async def main():
+        return await asyncio.gather(*(submit(route) for route in ("/a", "/b", "/c")))
+
+    assert asyncio.run(main()) == ["/a", "/b", "/c"]
+
+
+def test_batched_calls_take_slots_under_their_own_route(monkeypatch):
+    monkeypatch.setattr(admission, "ROUTE_ADMISSION", {"/a": {"lm": {"limit": 1}}})
+    limiter = admission.UpstreamLimiter("lm")
+    batcher = MicroBatcher(
+        functools.partial(dispatch_burst, limiter=limiter), max_size=16, max_wait=0.01
+    )
+
+    async def submit(route):
+        current_route.set(route)
+        return await batcher.submit(time.sleep, 0.2)
+
+    async def main():
+        start = time.perf_counter()
+        await asyncio.gather(submit("/a"), *(submit("/b") for _ in range(3)))
+        return time.perf_counter() - start
+
+    # Only /a is limited to one call at a time; the /b calls run alongside it.
+    assert asyncio.run(main()) < 0.4
+    assert limiter._route_slots["/a"]._value == 1
+    assert limiter._slots._value == limiter.limit
+
+
+def test_route_limit_applies_within_a_batch(monkeypatch):
+    monkeypatch.setattr(admission, "ROUTE_ADMISSION", {"/a": {"lm": {"limit": 1}}})
+    limiter = admission.UpstreamLimiter("lm")
+    batcher = MicroBatcher(
+        functools.partial(dispatch_burst, limiter=limiter), max_size=16, max_wait=0.01
+    )
+
+    async def submit(route):
+        current_route.set(route)
+        return await batcher.submit(time.sleep, 0.1)
+
+    async def main():
+        start = time.perf_counter()
+        await asyncio.gather(*(submit("/a") for _ in range(3)))
+        return time.perf_counter() - start
+
+    assert asyncio.run(main()) >= 0.3
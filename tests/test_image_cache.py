@@ -0,0 +1,53 @@
+import json
+import os
+import time
+
+from image_cache import IMAGE_FILES_PATH, ImageCache, image_key
+
+
+def store(cache, key, data, names=1):
+    files = [f"{key}-{i}.webp" for i in range(names)]
+    for name in files:
+        cache._write(name, data)
+    cache._write(f"{key}.json", json.dumps({"names": files, "list": True}).encode())
+    return files
+
+
+def test_evict_drops_least_recently_used_keys(tmp_path):
+    cache = ImageCache(directory=str(tmp_path), max_bytes=400)
+    old, new = image_key("m", "old"), image_key("m", "new")
+    store(cache, old, b"x" * 100)
+    past = time.time() - 60
+    for name in os.listdir(tmp_path):
+        os.utime(tmp_path / name, (past, past))
+    store(cache, new, b"x" * 100)
+    store(cache, image_key("m", "newest"), b"x" * 100)
+    cache.evict()
+    assert cache.lookup(old) is None
+    assert cache.lookup(new) is not None
+
+
+def test_evict_keeps_the_key_just_stored_even_if_too_big(tmp_path):
+    cache = ImageCache(directory=str(tmp_path), max_bytes=50)
+    other, key = image_key("m", "other"), image_key("m", "big")
+    store(cache, other, b"x" * 10)
+    (name,) = store(cache, key, b"x" * 100)
+    cache.evict(keep=key)
+    assert cache.path(name) is not None
+    assert cache.lookup(other) is None
+
+
+def test_urls_and_absolute(tmp_path):
+    cache = ImageCache(directory=str(tmp_path), base_url="")
+    key = image_key("m", "prompt")
+    (name,) = store(cache, key, b"x")
+    assert cache.lookup(key) == [f"{IMAGE_FILES_PATH}/{name}"]
+    assert cache.local_path(f"{IMAGE_FILES_PATH}/{name}") == str(tmp_path / name)
+    assert cache.absolute(
+        [f"{IMAGE_FILES_PATH}/{name}", "https://replicate.delivery/x.webp"],
+        "http://testserver/",
+    ) == [
+        f"http://testserver{IMAGE_FILES_PATH}/{name}",
+        "https://replicate.delivery/x.webp",
+    ]
+    assert cache.path("../etc/passwd") is None
@@ -0,0 +1,41 @@
+from links import extract_links, is_databricks_link
+
+RESULTS = (
+    "[snippet: Intro to Delta, title: Delta Lake, "
+    "link: https://www.example.com/delta-lake, date: 2024-05-01, source: Example], "
+    "[snippet: Genie docs, title: AI/BI Genie, "
+    "link: https://docs.databricks.com/en/genie/index.html, source: Databricks], "
+    "[snippet: Same post again, title: Delta Lake, "
+    "link: https://www.example.com/delta-lake., source: Example], "
+    "[snippet: Blog, title: Mosaic AI, link: https://databricks.com/blog/mosaic-ai]"
+)
+
+
+def test_extracts_databricks_links_first_in_order():
+    assert extract_links(RESULTS) == [
+        "https://docs.databricks.com/en/genie/index.html",
+        "https://databricks.com/blog/mosaic-ai",
+        "https://www.example.com/delta-lake",
+    ]
+
+
+def test_strips_trailing_punctuation_and_brackets():
+    assert extract_links("[link: https://databricks.com/a.;]") == [
+        "https://databricks.com/a"
+    ]
+    assert extract_links("link: https://databricks.com/b, date: x") == [
+        "https://databricks.com/b"
+    ]
+
+
+def test_no_links():
+    assert extract_links("") == []
+    assert extract_links("No good DuckDuckGo Search Result was found") == []
+    assert extract_links("link: ftp://databricks.com/file") == []
+
+
+def test_is_databricks_link():
+    assert is_databricks_link("https://databricks.com/blog")
+    assert is_databricks_link("https://www.Databricks.com:443/blog")
+    assert not is_databricks_link("https://notdatabricks.com/blog")
+    assert not is_databricks_link("https://databricks.com.evil.io/blog")
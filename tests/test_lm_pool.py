@@ -0,0 +1,37 @@
+import time
+
+import httpx
+import openai
+import pytest
+
+from lm_pool import PooledDatabricks
+
+
+class RateLimitedCompletions:
+    def __init__(self):
+        self.calls = 0
+
+    def create(self, **kwargs):
+        self.calls += 1
+        request = httpx.Request("POST", "http://upstream.invalid/chat/completions")
+        raise openai.RateLimitError(
+            "rate limited", response=httpx.Response(429, request=request), body=None
+        )
+
+
+def test_rate_limits_are_not_retried_with_dsp_backoff():
+    lm = PooledDatabricks(
+        model="primary",
+        model_type="chat",
+        api_key="test",
+        api_base="http://upstream.invalid/",
+    )
+    completions = RateLimitedCompletions()
+    lm.client.close()
+    lm.client = type("Client", (), {})()
+    lm.client.chat = type("Chat", (), {"completions": completions})()
+    start = time.perf_counter()
+    with pytest.raises(openai.RateLimitError):
+        lm("Hello")
+    assert completions.calls == 1
+    assert time.perf_counter() - start < 1
@@ -0,0 +1,148 @@
+import asyncio
+import threading
+
+import pytest
+
+from admission import Overloaded, UpstreamLimiter
+from resilience import CircuitBreaker, DeadlineExceeded, FailoverRouter
+from upstream import run_upstream
+
+
+def make_limiter(monkeypatch, limit=1, max_queue=0, max_wait=5.0):
+    monkeypatch.setenv("ADMISSION_LM_LIMIT", str(limit))
+    monkeypatch.setenv("ADMISSION_LM_MAX_QUEUE", str(max_queue))
+    monkeypatch.setenv("ADMISSION_LM_MAX_WAIT", str(max_wait))
+    return UpstreamLimiter("lm")
+
+
+def blocking_attempt(release, results):
+    """An attempt that runs in an executor thread until ``release`` is set."""
+
+    def call(model):
+        release.wait(5)
+        return results.get(model, model)
+
+    async def attempt(model):
+        return await run_upstream(call, model)
+
+    return attempt
+
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failures=2, reset_seconds=60)
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+
+def test_breaker_half_open_allows_one_trial():
+    breaker = CircuitBreaker(failures=1, reset_seconds=0)
+    breaker.record_failure()
+    assert breaker.state == "half-open"
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_router_fails_over_while_breaker_is_open():
+    router = FailoverRouter("primary", "fallback")
+    router.breaker = CircuitBreaker(failures=1, reset_seconds=60)
+
+    async def attempt(model):
+        if model == "primary":
+            raise RuntimeError("upstream error")
+        return model
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(router.call(attempt, deadline=1))
+    assert asyncio.run(router.call(attempt, deadline=1)) == "fallback"
+
+
+def test_shed_calls_do_not_count_against_breaker(monkeypatch):
+    limiter = make_limiter(monkeypatch, limit=1, max_queue=0)
+    router = FailoverRouter("primary", "fallback")
+    release = threading.Event()
+    attempt = blocking_attempt(release, {})
+
+    async def main():
+        first = asyncio.create_task(router.call(attempt, deadline=5, limiter=limiter))
+        await asyncio.sleep(0.05)
+        with pytest.raises(Overloaded):
+            await router.call(attempt, deadline=5, limiter=limiter)
+        release.set()
+        return await first
+
+    assert asyncio.run(main()) == "primary"
+    assert router.breaker.consecutive_failures == 0
+
+
+def test_deadline_while_queued_does_not_count_against_breaker(monkeypatch):
+    limiter = make_limiter(monkeypatch, limit=1, max_queue=1)
+    router = FailoverRouter("primary", "fallback")
+    release = threading.Event()
+    attempt = blocking_attempt(release, {})
+
+    async def main():
+        first = asyncio.create_task(router.call(attempt, deadline=5, limiter=limiter))
+        await asyncio.sleep(0.05)
+        with pytest.raises(DeadlineExceeded):
+            await router.call(attempt, deadline=0.1, limiter=limiter)
+        release.set()
+        await first
+
+    asyncio.run(main())
+    assert router.breaker.consecutive_failures == 0
+
+
+def test_slot_is_held_until_the_call_completes_after_deadline(monkeypatch):
+    limiter = make_limiter(monkeypatch, limit=1)
+    router = FailoverRouter("primary")
+    release = threading.Event()
+    attempt = blocking_attempt(release, {})
+
+    async def main():
+        with pytest.raises(DeadlineExceeded):
+            await router.call(attempt, deadline=0.05, limiter=limiter)
+        # The executor thread is still running, so its slot is still taken.
+        assert limiter._slots.locked()
+        release.set()
+        for _ in range(100):
+            if not limiter._slots.locked():
+                break
+            await asyncio.sleep(0.01)
+        assert not limiter._slots.locked()
+
+    asyncio.run(main())
+    assert router.breaker.consecutive_failures == 1
+
+
+def test_losing_hedge_keeps_its_slot_until_it_completes(monkeypatch):
+    limiter = make_limiter(monkeypatch, limit=2)
+    router = FailoverRouter("primary", "fallback", hedge_delay=0.05)
+    release = threading.Event()
+
+    def call(model):
+        if model == "primary":
+            release.wait(5)
+        return model
+
+    async def attempt(model):
+        return await run_upstream(call, model)
+
+    async def main():
+        result = await router.call(attempt, deadline=5, limiter=limiter)
+        assert limiter._slots._value == 1
+        release.set()
+        for _ in range(100):
+            if limiter._slots._value == 2:
+                break
+            await asyncio.sleep(0.01)
+        assert limiter._slots._value == 2
+        return result
+
+    assert asyncio.run(main()) == "fallback"
+    # Losing a hedge race is not a failure of the primary.
+    assert router.breaker.consecutive_failures == 0
@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+class Upstream:
+    def __init__(self):
+        self.calls = 0
+        self.cancelled = 0
+        self.release = None
+
+    async def __call__(self):
+        self.calls += 1
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return self.calls
+
+
+def test_concurrent_callers_share_one_call():
+    flight, upstream = SingleFlight("test"), Upstream()
+
+    async def main():
+        upstream.release = asyncio.Event()
+        callers = [asyncio.create_task(flight.do("k", upstream)) for _ in range(3)]
+        await asyncio.sleep(0)
+        upstream.release.set()
+        return await asyncio.gather(*callers)
+
+    assert asyncio.run(main()) == [1, 1, 1]
+    assert upstream.calls == 1
+
+
+def test_one_caller_cancelling_leaves_the_call_for_the_others():
+    flight, upstream = SingleFlight("test"), Upstream()
+
+    async def main():
+        upstream.release = asyncio.Event()
+        first = asyncio.create_task(flight.do("k", upstream))
+        second = asyncio.create_task(flight.do("k", upstream))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        upstream.release.set()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(main()) == 1
+    assert upstream.cancelled == 0
+
+
+def test_last_caller_cancelling_cancels_the_call_and_the_next_starts_afresh():
+    flight, upstream = SingleFlight("test"), Upstream()
+
+    async def main():
+        upstream.release = asyncio.Event()
+        callers = [asyncio.create_task(flight.do("k", upstream)) for _ in range(2)]
+        await asyncio.sleep(0)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.sleep(0)
+        assert upstream.cancelled == 1
+        retry = asyncio.create_task(flight.do("k", upstream))
+        await asyncio.sleep(0)
+        upstream.release.set()
+        return await retry
+
+    assert asyncio.run(main()) == 2
+    assert flight._inflight == {} and flight._waiters == {}
+
+
+def test_errors_reach_every_caller():
+    flight = SingleFlight("test")
+    calls = 0
+
+    async def fail():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        raise ValueError("upstream")
+
+    async def main():
+        return await asyncio.gather(
+            *(flight.do("k", fail) for _ in range(3)), return_exceptions=True
+        )
+
+    results = asyncio.run(main())
+    assert calls == 1
+    assert all(isinstance(e, ValueError) for e in results)
@@ -0,0 +1,44 @@
+import asyncio
+
+from streaming import stream_field_line
+
+
+async def deltas(chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+def collect(chunks, prefix="Post:"):
+    async def run():
+        return [text async for text in stream_field_line(deltas(chunks), prefix)]
+
+    return asyncio.run(run())
+
+
+def test_streams_first_line_of_field():
+    chunks = [
+        "produce the post. We ",
+        "pick the keynote.\n\nCurrent Session: Keynote",
+        "\n\nPo",
+        "st: Loving ",
+        "the keynote!",
+        "\nMore text",
+    ]
+    assert "".join(collect(chunks)) == "Loving the keynote!"
+
+
+def test_ignores_prefix_inside_an_earlier_field():
+    chunks = [
+        "The User Post: mentions GenAI so we highlight it.",
+        "\n\nCurrent Session: None\n\nPost: Hello #DAIWT",
+    ]
+    assert collect(chunks) == ["Hello #DAIWT"]
+
+
+def test_marker_split_across_chunks():
+    chunks = ["reasoning.\n", "\n", "Post", ":", " ", "Hi", " there\n"]
+    assert "".join(collect(chunks)) == "Hi there"
+
+
+def test_no_field_yields_nothing():
+    assert collect(["just reasoning, Post: inline only"]) == []